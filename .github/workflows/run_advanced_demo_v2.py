@@ -151,20 +151,20 @@ def demo_global_registry_v2():
     variables_info = V2GlobalVariableRegistry.get_all_variables_info()
     
     for var_info in variables_info:
-        solution_name = var_info.get('solution_name', 'Unknown')
-        print(f"  {var_info.get('new_write_id', '')}: {var_info.get('name', '')}")
+        solution_name = var_info.solution_name
+        print(f"  {var_info.new_write_id}: {var_info.name}")
         
-        if var_info.get('is_formula', False):
-            formula = var_info.get('formula', '')
-            computed = var_info.get('computed_value', 0)
+        if var_info.is_formula:
+            formula = var_info.formula
+            computed = var_info.computed_value
             print(f"    Formula: {formula} → {computed}")
         else:
-            value = var_info.get('value', '')
+            value = var_info.value
             print(f"    Value: {value}")
         
         # Показываем все способы обращения
-        legacy_id = var_info.get('legacy_full_id', '')
-        read_id = var_info.get('new_read_id', '')
+        legacy_id = var_info.legacy_full_id
+        read_id = var_info.new_read_id
         if legacy_id:
             print(f"    Legacy: {legacy_id}")
         if read_id:
@@ -213,7 +213,7 @@ def demo_interactive_testing_v2():
         for expr in test_expressions:
             try:
                 parsed = ExpressionParser.parse_expression(expr)
-                print(f"  ✅ {expr} → {parsed['type'].value}")
+                print(f"  ✅ {expr} → {parsed.type.value}")
             except Exception as e:
                 print(f"  ❌ {expr} → {e}")
         
@@ -267,10 +267,9 @@ def run_interactive_formula_test_v2():
                 if '=' in formula:
                     # Это выражение - парсим его
                     parsed = ExpressionParser.parse_expression(formula)
-                    print(f"✅ Выражение: {parsed['type'].value}")
-                    for key, value in parsed.items():
-                        if key != 'type':
-                            print(f"   {key}: {value}")
+                    print(f"✅ Выражение: {parsed.type.value}")
+                    for key, value in parsed.fields().items():
+                        print(f"   {key}: {value}")
                 else:
                     # Это формула - вычисляем её
                     result = V2FormulaEvaluator.evaluate_formula(formula, solution_registry)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for V2 formula compilation and evaluation
+"""
+
+import pytest
+
+from variable_system_v2 import V2FormulaEvaluator, V2Solution
+
+
+def _make_solutions(*names):
+    """Registry of empty solutions by name"""
+    return {name: V2Solution(name) for name in names}
+
+
+def test_keyword_named_references():
+    """Variable and solution names that are Python keywords evaluate as references"""
+    solutions = _make_solutions("from", "box")
+    solutions["from"].execute_expression("len@from=5", solutions)
+    solutions["box"].execute_expression("class@box=7", solutions)
+
+    solutions["box"].execute_expression("r1@box=len.from + 1", solutions)
+    solutions["box"].execute_expression("r2@box=class.box * 2", solutions)
+
+    assert solutions["box"].get_variable("r1").value == 6.0
+    assert solutions["box"].get_variable("r2").value == 14.0
+    assert solutions["box"].get_variable("r1").computation_error is None
+
+
+def test_reserved_mangled_name_rejected():
+    """A user-written name with the mangling prefix is not treated as a reference"""
+    solutions = _make_solutions("box")
+    solutions["box"].execute_expression("length@box=600", solutions)
+
+    with pytest.raises(ValueError):
+        V2FormulaEvaluator.evaluate_formula("_ref_0 + length.box", solutions)
+    with pytest.raises(ValueError):
+        V2FormulaEvaluator.evaluate_formula("_ref_0", solutions)
+
+
+def test_attribute_chain_rejected():
+    """Only variable.solution references are allowed, not longer attribute chains"""
+    solutions = _make_solutions("box")
+    solutions["box"].execute_expression("length@box=600", solutions)
+
+    with pytest.raises(ValueError):
+        V2FormulaEvaluator.evaluate_formula("length.box.real", solutions)
+
+
+def test_function_and_power_syntax():
+    """Built-in functions and ^ still work with mangled references"""
+    solutions = _make_solutions("box")
+    solutions["box"].execute_expression("length@box=3", solutions)
+    solutions["box"].execute_expression("width@box=4", solutions)
+
+    assert V2FormulaEvaluator.evaluate_formula("sqrt(length.box^2 + width.box^2)", solutions) == 5.0
+    assert V2FormulaEvaluator.evaluate_formula("max(length.box, width.box, 2)", solutions) == 4.0
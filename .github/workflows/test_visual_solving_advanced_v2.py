@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for V2 dependency tracking, cache invalidation and cycle checks
+"""
+
+import warnings
+
+import pytest
+
+from visual_solving_advanced_v2 import (
+    CircularDependencyWarning, HybridBoxSolution, HybridSolution, V2DependencyTracker, VariableType,
+    v2_dependency_tracker, v2_solution_manager
+)
+
+
+def test_has_circular_dependency_uses_proposed_dependencies():
+    """The checked variable's edges come from the argument, the rest from the graph"""
+    tracker = V2DependencyTracker()
+    tracker.add_dependency("b.s", {"c.s"})
+    tracker.add_dependency("c.s", {"d.s"})
+
+    assert tracker.has_circular_dependency("d.s", {"b.s"})
+    assert tracker.has_circular_dependency("a.s", {"a.s"})
+    assert not tracker.has_circular_dependency("a.s", {"b.s", "c.s"})
+
+    # The graph's old edges of the checked variable are ignored
+    tracker.add_dependency("a.s", {"b.s"})
+    assert tracker.has_circular_dependency("d.s", {"a.s"})
+    assert not tracker.has_circular_dependency("b.s", {"d.s"})
+    assert not tracker.has_circular_dependency("c.s", {"e.s"})
+
+
+def test_diamond_is_not_a_cycle():
+    """Shared dependencies reached along two paths are not reported as a cycle"""
+    tracker = V2DependencyTracker()
+    tracker.add_dependency("b.s", {"d.s"})
+    tracker.add_dependency("c.s", {"d.s"})
+
+    assert not tracker.has_circular_dependency("a.s", {"b.s", "c.s"})
+
+
+def test_detect_cycles_returns_cyclic_components():
+    """All strongly connected components that form cycles are found in one pass"""
+    tracker = V2DependencyTracker()
+    tracker.add_dependency("a.s", {"b.s"})
+    tracker.add_dependency("b.s", {"c.s"})
+    tracker.add_dependency("c.s", {"a.s", "d.s"})
+    tracker.add_dependency("d.s", {"e.s"})
+    tracker.add_dependency("x.s", {"x.s"})
+    tracker.add_dependency("y.s", {"d.s"})
+
+    cycles = sorted(sorted(component) for component in tracker.detect_cycles())
+    assert cycles == [["a.s", "b.s", "c.s"], ["x.s"]]
+
+    tracker.add_dependency("c.s", {"d.s"})
+    tracker.add_dependency("x.s", set())
+    assert tracker.detect_cycles() == []
+
+
+def test_formula_cycle_warns_and_is_registered():
+    """Writing a formula that closes a cycle warns once and keeps the graph in sync"""
+    solution = HybridSolution("cycle_test")
+    solution.create_variable("x", 1, VariableType.CONTROLLABLE)
+    solution.create_variable("y", 0, VariableType.CALCULATED)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", CircularDependencyWarning)
+        solution.execute_v2_expression("y@cycle_test=x.cycle_test + 1")
+
+    with pytest.warns(CircularDependencyWarning, match="x@cycle_test"):
+        solution.execute_v2_expression("x@cycle_test=y.cycle_test * 2")
+    assert v2_dependency_tracker.get_dependencies("x.cycle_test") == {"y.cycle_test"}
+    assert ["x.cycle_test", "y.cycle_test"] in [sorted(c) for c in v2_dependency_tracker.detect_cycles()]
+
+    # Rewriting the same formula does not change the graph and does not warn again
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", CircularDependencyWarning)
+        solution.execute_v2_expression("x@cycle_test=y.cycle_test * 2")
+
+
+def test_v2_only_variable_write_invalidates_dependents():
+    """A variable created only in the V2 layer still refreshes formulas that read it"""
+    box = HybridBoxSolution("v2_only", 600, 400, 18)
+    box.execute_v2_expression("foo@v2_only=5")
+    result = box.create_variable("r", 0, VariableType.CALCULATED)
+    result.set_formula("length.v2_only + foo.v2_only", v2_solution_manager.get_all_solutions())
+    assert result.get_computed_value() == 605.0
+
+    box.execute_v2_expression("foo@v2_only=50")
+    assert result.get_computed_value() == 650.0
+
+    # Writes through a V2 alias reach the same dependents
+    box.execute_v2_expression("K=7")
+    result.set_formula("length.v2_only + K.v2_only", v2_solution_manager.get_all_solutions())
+    assert result.get_computed_value() == 607.0
+    box.execute_v2_expression("K=70")
+    assert result.get_computed_value() == 670.0
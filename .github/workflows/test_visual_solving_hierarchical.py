@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tests for lazily loaded parent_solutions
+"""
+
+from visual_solving_hierarchical import LazyParentList
+
+
+def _lazy(*values):
+    """LazyParentList over raw dicts and the list of loaded dicts"""
+    loaded = []
+
+    def loader(data):
+        loaded.append(data)
+        return data["value"]
+
+    return LazyParentList([{"value": value} for value in values], loader), loaded
+
+
+def test_nothing_is_loaded_before_access():
+    parents, loaded = _lazy(1, 2)
+    assert not parents.is_loaded
+    assert loaded == []
+
+
+def test_concatenation_materializes_from_either_side():
+    parents, loaded = _lazy(1, 2)
+    assert [0] + parents == [0, 1, 2]
+    assert parents.is_loaded
+    assert len(loaded) == 2
+
+    parents, _ = _lazy(1)
+    assert parents + [3] == [1, 3]
+
+
+def test_sequence_operations_see_loaded_items():
+    parents, loaded = _lazy(1, 2, 3)
+    assert list(reversed(parents)) == [3, 2, 1]
+    assert parents == [1, 2, 3]
+    assert 2 in parents and parents.index(3) == 2
+
+    parents.append(4)
+    parents += [5]
+    assert parents.pop() == 5
+    del parents[0]
+    assert list(parents) == [2, 3, 4]
+    assert len(loaded) == 3
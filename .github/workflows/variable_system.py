@@ -128,41 +128,49 @@ class FormulaEvaluator:
         Вычисление выражения с заменой variable.solution на значения
         """
         try:
-            # Находим все ссылки вида variable.solution
-            references = self.parser.find_read_references(expression)
-            
-            # Заменяем ссылки на фактические значения
-            evaluated_expression = expression
-            
-            for ref in references:
-                var_name = ref['variable']
-                solution_name = ref['solution']
-                full_ref = ref['full_reference']
-                
-                # Получаем значение
-                value = self._get_variable_value(var_name, solution_name)
-                
-                if value is not None:
-                    # Заменяем ссылку на значение
-                    evaluated_expression = evaluated_expression.replace(full_ref, str(value))
-                else:
-                    raise ValueError(f"Variable {full_ref} not found")
-            
-            # Заменяем ^ на **
-            evaluated_expression = evaluated_expression.replace('^', '**')
+            return self._evaluate_checked(expression, current_solution)
+        except Exception as e:
+            raise ValueError(f"Error evaluating expression '{expression}': {str(e)}")
+    
+    def _evaluate_checked(self, expression: str, current_solution: 'Solution' = None) -> float:
+        """
+        Вычисление выражения без перехвата исключений
+        
+        Используется при вложенных вычислениях: ошибки поднимаются
+        до внешней точки входа (evaluate_expression / get_variable_value).
+        """
+        # Находим все ссылки вида variable.solution
+        references = self.parser.find_read_references(expression)
+        
+        # Заменяем ссылки на фактические значения
+        evaluated_expression = expression
+        
+        for ref in references:
+            var_name = ref['variable']
+            solution_name = ref['solution']
+            full_ref = ref['full_reference']
             
-            # Добавляем математические функции в контекст
-            eval_context = {
-                '__builtins__': {},
-                **self.parser.math_functions
-            }
+            # Получаем значение
+            value = self._get_variable_value(var_name, solution_name)
             
-            # Вычисляем выражение
-            result = eval(evaluated_expression, eval_context)
-            return float(result)
+            if value is None:
+                raise ValueError(f"Variable {full_ref} not found")
             
-        except Exception as e:
-            raise ValueError(f"Error evaluating expression '{expression}': {str(e)}")
+            # Заменяем ссылку на значение
+            evaluated_expression = evaluated_expression.replace(full_ref, str(value))
+        
+        # Заменяем ^ на **
+        evaluated_expression = evaluated_expression.replace('^', '**')
+        
+        # Добавляем математические функции в контекст
+        eval_context = {
+            '__builtins__': {},
+            **self.parser.math_functions
+        }
+        
+        # Вычисляем выражение
+        result = eval(evaluated_expression, eval_context)
+        return float(result)
     
     def _get_variable_value(self, var_name: str, solution_name: str) -> Optional[float]:
         """Получение значения переменной из решения"""
@@ -176,6 +184,8 @@ class Variable:
     Переменная с поддержкой нового синтаксиса
     """
     
+    __slots__ = ('name', 'value', 'variable_type', 'dependencies', 'dependents')
+    
     def __init__(self, name: str, value: Union[float, str], 
                  variable_type: VariableType = VariableType.CONTROLLABLE):
         self.name = name
@@ -201,6 +211,8 @@ class Solution:
     Базовый класс решения с поддержкой нового синтаксиса переменных
     """
     
+    __slots__ = ('name', 'variables', 'aliases', 'solutions_registry', 'evaluator')
+    
     def __init__(self, name: str):
         self.name = name
         self.variables: Dict[str, Variable] = {}
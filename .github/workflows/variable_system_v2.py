@@ -2,7 +2,11 @@
 # Новая система адресации переменных: variable@solution и variable.solution
 
 import re
-from typing import Dict, List, Set, Optional, Union, Tuple
+import ast
+import math
+import sys
+from functools import lru_cache
+from typing import Callable, Dict, List, Set, Optional, Union, Tuple, NamedTuple
 from enum import Enum
 
 class ExpressionType(Enum):
@@ -12,6 +16,23 @@ class ExpressionType(Enum):
     READ = "read"                 # a=volume.box
     ALIAS = "alias"               # L=600 (внутри solution)
 
+class ParsedExpression(NamedTuple):
+    """Результат разбора выражения; неиспользуемые для данного типа поля равны None"""
+    type: ExpressionType
+    variable: Optional[str] = None
+    solution: Optional[str] = None
+    value: Union[int, float, str, None] = None
+    formula: Optional[str] = None
+    dependencies: Optional[frozenset] = None
+    target_variable: Optional[str] = None
+    source_variable: Optional[str] = None
+    source_solution: Optional[str] = None
+    alias: Optional[str] = None
+    
+    def fields(self) -> Dict[str, any]:
+        """Заполненные поля (кроме type) для отображения"""
+        return {key: value for key, value in zip(self._fields[1:], self[1:]) if value is not None}
+
 class ExpressionParser:
     """Парсер новых выражений с @ и . синтаксисом"""
     
@@ -21,8 +42,11 @@ class ExpressionParser:
     VARIABLE_REF_PATTERN = r'([a-zA-Z_][a-zA-Z0-9_]*)\.([a-zA-Z_][a-zA-Z0-9_]*)'
     ALIAS_PATTERN = r'^([a-zA-Z_][a-zA-Z0-9_]*)=(.+)$'
     
+    # Скомпилированный паттерн ссылок variable.solution
+    _VAR_REF_RE = re.compile(VARIABLE_REF_PATTERN)
+    
     @staticmethod
-    def parse_expression(expression: str) -> Dict[str, any]:
+    def parse_expression(expression: str) -> ParsedExpression:
         """
         Парсить выражение и определить его тип
         
@@ -38,75 +62,78 @@ class ExpressionParser:
         assignment_match = re.match(ExpressionParser.ASSIGNMENT_PATTERN, expression)
         if assignment_match:
             variable, solution, value_expr = assignment_match.groups()
+            # Интернируем имена для быстрого поиска в словарях
+            variable = sys.intern(variable)
+            solution = sys.intern(solution)
             
             # Определяем, это значение или формула
             if ExpressionParser._contains_variable_references(value_expr):
-                return {
-                    'type': ExpressionType.FORMULA,
-                    'variable': variable,
-                    'solution': solution,
-                    'formula': value_expr,
-                    'dependencies': ExpressionParser.extract_variable_references(value_expr)
-                }
+                return ParsedExpression(
+                    type=ExpressionType.FORMULA,
+                    variable=variable,
+                    solution=solution,
+                    formula=value_expr,
+                    dependencies=frozenset(ExpressionParser.extract_variable_references(value_expr))
+                )
             else:
-                return {
-                    'type': ExpressionType.ASSIGNMENT,
-                    'variable': variable,
-                    'solution': solution,
-                    'value': ExpressionParser._parse_value(value_expr)
-                }
+                return ParsedExpression(
+                    type=ExpressionType.ASSIGNMENT,
+                    variable=variable,
+                    solution=solution,
+                    value=ExpressionParser._parse_value(value_expr)
+                )
         
         # Проверяем read (variable=other.solution)
         read_match = re.match(ExpressionParser.READ_PATTERN, expression)
         if read_match:
             target_var, source_var, source_solution = read_match.groups()
-            return {
-                'type': ExpressionType.READ,
-                'target_variable': target_var,
-                'source_variable': source_var,
-                'source_solution': source_solution
-            }
+            return ParsedExpression(
+                type=ExpressionType.READ,
+                target_variable=sys.intern(target_var),
+                source_variable=sys.intern(source_var),
+                source_solution=sys.intern(source_solution)
+            )
         
         # Проверяем alias (L=600) - только если внутри solution
         alias_match = re.match(ExpressionParser.ALIAS_PATTERN, expression)
         if alias_match:
+            # ALIAS_PATTERN допускает в алиасе только [a-zA-Z0-9_],
+            # поэтому отдельная проверка на @ и . здесь не нужна
             alias, value_expr = alias_match.groups()
             
-            # Проверяем, что алиас не содержит запрещенные символы
-            if not ExpressionParser._is_valid_alias(alias):
-                raise ValueError(f"Invalid alias '{alias}': cannot contain @ or . symbols")
-            
-            return {
-                'type': ExpressionType.ALIAS,
-                'alias': alias,
-                'value': ExpressionParser._parse_value(value_expr)
-            }
+            return ParsedExpression(
+                type=ExpressionType.ALIAS,
+                alias=sys.intern(alias),
+                value=ExpressionParser._parse_value(value_expr)
+            )
         
         raise ValueError(f"Invalid expression: {expression}")
     
     @staticmethod
     def extract_variable_references(formula: str) -> Set[str]:
         """Извлечь все ссылки на переменные из формулы (variable.solution)"""
-        references = set()
-        matches = re.findall(ExpressionParser.VARIABLE_REF_PATTERN, formula)
-        
-        for variable, solution in matches:
-            ref = f"{variable}.{solution}"
-            references.add(ref)
-        
-        return references
+        return {f"{variable}.{solution}"
+                for variable, solution in ExpressionParser._VAR_REF_RE.findall(formula)}
     
     @staticmethod
     def _contains_variable_references(expression: str) -> bool:
         """Проверить, содержит ли выражение ссылки на переменные"""
-        return bool(re.search(ExpressionParser.VARIABLE_REF_PATTERN, expression))
+        # Без точки ссылки быть не может - числовые значения не доходят до regex
+        return '.' in expression and ExpressionParser._VAR_REF_RE.search(expression) is not None
     
     @staticmethod
     def _parse_value(value_str: str) -> Union[int, float, str]:
         """Попытаться преобразовать строку в число"""
         value_str = value_str.strip()
         
-        # Пробуем int
+        # Быстрый путь без исключений: обычные десятичные 12, -3, 2.5
+        digits = value_str[1:] if value_str[:1] in ('+', '-') else value_str
+        if digits.isdecimal():
+            return int(value_str)
+        if digits.replace('.', '', 1).isdecimal():
+            return float(value_str)
+        
+        # Пробуем int (например, 1_000)
         try:
             return int(value_str)
         except ValueError:
@@ -124,6 +151,7 @@ class ExpressionParser:
     @staticmethod
     def _is_valid_alias(alias: str) -> bool:
         """Проверить, что алиас не содержит @ и . символы"""
+        # Два поиска `in` быстрее str.translate/frozenset на коротких строках
         return '@' not in alias and '.' not in alias
 
 class V2FormulaEvaluator:
@@ -131,18 +159,43 @@ class V2FormulaEvaluator:
     
     # Поддерживаемые функции (те же что в Advanced)
     FUNCTIONS = {
-        'sin': lambda x: __import__('math').sin(x),
-        'cos': lambda x: __import__('math').cos(x),
-        'tan': lambda x: __import__('math').tan(x),
-        'sqrt': lambda x: __import__('math').sqrt(x),
+        'sin': math.sin,
+        'cos': math.cos,
+        'tan': math.tan,
+        'sqrt': math.sqrt,
         'abs': abs,
         'min': min,
         'max': max,
         'round': round,
     }
     
+    # Безопасный глобальный контекст для eval (создается один раз)
+    _SAFE_GLOBALS = {
+        "__builtins__": {},
+        **FUNCTIONS
+    }
+    
+    # Разрешенные узлы AST формулы: арифметика, сравнения и логика (результат 1.0/0.0),
+    # условное выражение, списки/кортежи аргументов (min([1, 2])), вызовы функций, ссылки
+    _ALLOWED_NODES = (
+        ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Constant, ast.Load,
+        ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+        ast.UAdd, ast.USub, ast.Not,
+        ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+        ast.BoolOp, ast.And, ast.Or,
+        ast.IfExp, ast.List, ast.Tuple,
+    )
+    
+    # Префикс искаженных имен ссылок; в пользовательском тексте формулы запрещен
+    _REF_PREFIX = '_ref_'
+    _RESERVED_NAME_RE = re.compile(r"(?<![\w.])" + re.escape(_REF_PREFIX))
+    
+    # Ошибки разбора и вычисления, которые превращаются в ValueError
+    _EVALUATION_ERRORS = (SyntaxError, ValueError, TypeError, NameError, ArithmeticError)
+    
     @staticmethod
-    def evaluate_formula(formula: str, solution_registry: Dict[str, 'V2Solution']) -> float:
+    def evaluate_formula(formula: str, solution_registry: Dict[str, 'V2Solution'],
+                         locals_dict: Optional[Dict[str, float]] = None) -> float:
         """
         Вычислить формулу с новым синтаксисом
         
@@ -150,33 +203,83 @@ class V2FormulaEvaluator:
         - "width.panel - 2*thickness.edge"
         - "sqrt(length.panel^2 + width.panel^2)"
         - "max(height.box, height.panel, 18)"
+        
+        locals_dict - необязательный словарь для повторного использования
+        между вычислениями одной и той же формулы (заполняется на месте).
         """
         try:
-            # Заменяем ссылки на переменные их значениями
-            resolved_formula = V2FormulaEvaluator._resolve_variable_references(formula, solution_registry)
-            
-            # Заменяем ^ на ** для Python
-            resolved_formula = resolved_formula.replace('^', '**')
+            # Компилируем формулу (один раз на строку формулы)
+            compiled = V2FormulaEvaluator.compile_formula(formula)
             
-            # Создаем безопасный контекст для eval
-            safe_dict = {
-                "__builtins__": {},
-                **V2FormulaEvaluator.FUNCTIONS
-            }
+            # Подставляем значения ссылок в локальные имена
+            locals_dict = V2FormulaEvaluator._resolve_variable_values(compiled, solution_registry, locals_dict)
             
             # Вычисляем результат
-            result = eval(resolved_formula, safe_dict)
-            return float(result)
+            return float(eval(compiled.code, V2FormulaEvaluator._SAFE_GLOBALS, locals_dict))
             
-        except Exception as e:
-            raise ValueError(f"Error evaluating formula '{formula}': {str(e)}")
+        except V2FormulaEvaluator._EVALUATION_ERRORS as e:
+            raise ValueError(f"Error evaluating formula '{formula}': {e}") from e
+    
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def compile_formula(formula: str) -> 'CompiledFormula':
+        """
+        Скомпилировать формулу в code object через AST
+        
+        Ссылки variable.solution находятся тем же regex, что и в парсере, и
+        заменяются искаженными именами (_ref_0, _ref_1, ...) до ast.parse,
+        поэтому имена-ключевые слова Python (len.from, class.box) допустимы.
+        Дерево проверяется по белому списку узлов до компиляции.
+        Результат кэшируется (ограниченный LRU: разовые выражения из UI не копятся).
+        """
+        # Имена с префиксом искажения зарезервированы под ссылки
+        if V2FormulaEvaluator._RESERVED_NAME_RE.search(ExpressionParser._VAR_REF_RE.sub(' ', formula)):
+            raise ValueError(f"Names starting with '{V2FormulaEvaluator._REF_PREFIX}' are reserved in formulas")
+        
+        references: Dict[Tuple[str, str], str] = {}
+        
+        def mangle_reference(match: re.Match) -> str:
+            key = match.groups()
+            if key not in references:
+                references[key] = f"{V2FormulaEvaluator._REF_PREFIX}{len(references)}"
+            return references[key]
+        
+        source = ExpressionParser._VAR_REF_RE.sub(mangle_reference, formula)
+        
+        # Заменяем ^ на ** для Python
+        tree = ast.parse(source.replace('^', '**').strip(), mode='eval')
+        
+        # Проверяем безопасность дерева
+        mangled_names = set(references.values())
+        for node in ast.walk(tree):
+            if not isinstance(node, V2FormulaEvaluator._ALLOWED_NODES):
+                raise ValueError(f"Unsupported syntax in formula: {type(node).__name__}")
+            if isinstance(node, ast.Name):
+                if node.id not in mangled_names and node.id not in V2FormulaEvaluator.FUNCTIONS:
+                    raise ValueError(f"Unknown name '{node.id}'")
+            elif isinstance(node, ast.Call):
+                if not isinstance(node.func, ast.Name) or node.func.id not in V2FormulaEvaluator.FUNCTIONS:
+                    raise ValueError("Only built-in formula functions can be called")
+                if node.keywords:
+                    raise ValueError("Keyword arguments are not supported in formulas")
+            elif isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+                raise ValueError(f"Unsupported constant in formula: {node.value!r}")
+        
+        return CompiledFormula(
+            code=compile(tree, '<formula>', 'eval'),
+            references=tuple((mangled, variable, solution)
+                             for (variable, solution), mangled in references.items())
+        )
     
     @staticmethod
-    def _resolve_variable_references(formula: str, solution_registry: Dict[str, 'V2Solution']) -> str:
-        """Заменить ссылки variable.solution их значениями"""
-        def replace_reference(match):
-            variable_name = match.group(1)
-            solution_name = match.group(2)
+    def _resolve_variable_values(compiled: 'CompiledFormula',
+                                 solution_registry: Dict[str, 'V2Solution'],
+                                 values: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        """Получить значения ссылок variable.solution по искаженным именам"""
+        if values is None:
+            values = {}
+        
+        for mangled, variable_name, solution_name in compiled.references:
             full_ref = f"{variable_name}.{solution_name}"
             
             # Получаем solution
@@ -195,18 +298,21 @@ class V2FormulaEvaluator:
             if not isinstance(value, (int, float)):
                 raise ValueError(f"Variable '{full_ref}' is not numeric: {value}")
             
-            return str(value)
+            values[mangled] = value
         
-        # Заменяем все ссылки на переменные
-        resolved = re.sub(ExpressionParser.VARIABLE_REF_PATTERN, replace_reference, formula)
-        return resolved
+        return values
+
+class CompiledFormula(NamedTuple):
+    """Скомпилированная формула: code object и ссылки (искаженное имя, переменная, solution)"""
+    code: object
+    references: Tuple[Tuple[str, str, str], ...]
 
 class V2Variable:
     """Переменная с новой системой адресации"""
     
     def __init__(self, name: str, value: any, solution_name: str):
-        self.name: str = name
-        self.solution_name: str = solution_name
+        self.name: str = sys.intern(name)
+        self.solution_name: str = sys.intern(solution_name)
         self._value: any = value
         
         # Формулы и зависимости
@@ -215,6 +321,12 @@ class V2Variable:
         self.dependencies: Set[str] = set()
         self.last_computed_value: any = None
         self.computation_error: str = None
+        
+        # Словарь локальных имен формулы, переиспользуется между пересчетами
+        self._locals: Dict[str, float] = {}
+        
+        # Вызывается после смены значения или формулы (кэши поверх переменной)
+        self.on_change: Optional[Callable[[], None]] = None
     
     @property
     def full_id(self) -> str:
@@ -241,6 +353,8 @@ class V2Variable:
         self.formula = None
         self.dependencies.clear()
         self.computation_error = None
+        if self.on_change is not None:
+            self.on_change()
     
     def set_formula(self, formula: str, solution_registry: Dict[str, 'V2Solution']):
         """Установить формулу для переменной"""
@@ -249,14 +363,18 @@ class V2Variable:
         
         # Извлекаем зависимости
         self.dependencies = ExpressionParser.extract_variable_references(formula)
+        self._locals = {}
         
         # Вычисляем начальное значение
         try:
-            self.last_computed_value = V2FormulaEvaluator.evaluate_formula(formula, solution_registry)
+            self.last_computed_value = V2FormulaEvaluator.evaluate_formula(formula, solution_registry, self._locals)
             self.computation_error = None
         except Exception as e:
             self.computation_error = str(e)
             self.last_computed_value = 0.0
+        
+        if self.on_change is not None:
+            self.on_change()
     
     def get_computed_value(self, solution_registry: Dict[str, 'V2Solution'] = None) -> any:
         """Вычислить значение формулы"""
@@ -267,7 +385,7 @@ class V2Variable:
             return self.last_computed_value if self.last_computed_value is not None else 0.0
         
         try:
-            computed = V2FormulaEvaluator.evaluate_formula(self.formula, solution_registry)
+            computed = V2FormulaEvaluator.evaluate_formula(self.formula, solution_registry, self._locals)
             self.last_computed_value = computed
             self.computation_error = None
             return computed
@@ -285,28 +403,31 @@ class V2Solution:
     """Solution с новой системой переменных"""
     
     def __init__(self, name: str):
-        self.name: str = name
+        self.name: str = sys.intern(name)
+        # Имена и алиасы в одном словаре: алиас указывает на тот же объект V2Variable
         self.variables: Dict[str, V2Variable] = {}
-        self.aliases: Dict[str, str] = {}  # {alias: variable_name}
+        self._alias_names: Set[str] = set()  # только для итерации/отладки
         
+        # Вызывается для каждой созданной переменной (подписка кэшей на её изменения)
+        self.on_variable_created: Optional[Callable[[V2Variable], None]] = None
+        
+    @property
+    def aliases(self) -> Dict[str, str]:
+        """Алиасы решения: {alias: variable_name}"""
+        return {alias: var.name for alias, var in self.variables.items() if alias in self._alias_names}
+    
     def create_variable(self, name: str, value: any = None) -> V2Variable:
         """Создать переменную"""
         variable = V2Variable(name, value, self.name)
         self.variables[name] = variable
+        self._alias_names.discard(name)
+        if self.on_variable_created is not None:
+            self.on_variable_created(variable)
         return variable
     
     def get_variable(self, name_or_alias: str) -> Optional[V2Variable]:
         """Получить переменную по имени или алиасу"""
-        # Сначала проверяем прямое имя
-        if name_or_alias in self.variables:
-            return self.variables[name_or_alias]
-        
-        # Затем проверяем алиасы
-        if name_or_alias in self.aliases:
-            real_name = self.aliases[name_or_alias]
-            return self.variables.get(real_name)
-        
-        return None
+        return self.variables.get(name_or_alias)
     
     def set_alias(self, alias: str, variable_name: str):
         """Установить алиас для переменной"""
@@ -316,43 +437,48 @@ class V2Solution:
         if variable_name not in self.variables:
             raise ValueError(f"Variable '{variable_name}' not found")
         
-        self.aliases[alias] = variable_name
+        if alias in self.variables and alias not in self._alias_names:
+            # Прямое имя переменной имеет приоритет над алиасом
+            return
+        
+        self.variables[alias] = self.variables[variable_name]
+        self._alias_names.add(alias)
     
     def execute_expression(self, expression: str, solution_registry: Dict[str, 'V2Solution']):
         """Выполнить выражение с новым синтаксисом"""
         parsed = ExpressionParser.parse_expression(expression)
         
-        if parsed['type'] == ExpressionType.ASSIGNMENT:
+        if parsed.type == ExpressionType.ASSIGNMENT:
             # variable@solution=value
-            var_name = parsed['variable']
-            if parsed['solution'] != self.name:
-                raise ValueError(f"Cannot assign to variable in different solution: {parsed['solution']}")
+            var_name = parsed.variable
+            if parsed.solution != self.name:
+                raise ValueError(f"Cannot assign to variable in different solution: {parsed.solution}")
             
             # Создаем или обновляем переменную
             if var_name not in self.variables:
                 self.create_variable(var_name)
             
-            self.variables[var_name].value = parsed['value']
+            self.variables[var_name].value = parsed.value
             
-        elif parsed['type'] == ExpressionType.FORMULA:
+        elif parsed.type == ExpressionType.FORMULA:
             # variable@solution=formula
-            var_name = parsed['variable']
-            if parsed['solution'] != self.name:
-                raise ValueError(f"Cannot assign to variable in different solution: {parsed['solution']}")
+            var_name = parsed.variable
+            if parsed.solution != self.name:
+                raise ValueError(f"Cannot assign to variable in different solution: {parsed.solution}")
             
             # Создаем или обновляем переменную
             if var_name not in self.variables:
                 self.create_variable(var_name)
             
-            self.variables[var_name].set_formula(parsed['formula'], solution_registry)
+            self.variables[var_name].set_formula(parsed.formula, solution_registry)
             
-        elif parsed['type'] == ExpressionType.ALIAS:
+        elif parsed.type == ExpressionType.ALIAS:
             # L=600 (внутри solution)
-            alias = parsed['alias']
-            value = parsed['value']
+            alias = parsed.alias
+            value = parsed.value
             
             # Создаем временную переменную для алиаса если её нет
-            if alias not in self.variables and alias not in self.aliases:
+            if alias not in self.variables:
                 var = self.create_variable(f"_alias_{alias}")
                 var.value = value
                 self.set_alias(alias, var.name)
@@ -363,22 +489,23 @@ class V2Solution:
                     var.value = value
         
         else:
-            raise ValueError(f"Cannot execute expression type: {parsed['type']}")
+            raise ValueError(f"Cannot execute expression type: {parsed.type}")
     
     def get_all_variables(self) -> List[V2Variable]:
         """Получить все переменные"""
-        return list(self.variables.values())
+        return [var for name, var in self.variables.items() if name not in self._alias_names]
     
     def debug_info(self) -> str:
         """Отладочная информация"""
+        variables = self.get_all_variables()
         info = f"Solution '{self.name}':\n"
-        info += f"Variables ({len(self.variables)}):\n"
+        info += f"Variables ({len(variables)}):\n"
         
-        for var in self.variables.values():
+        for var in variables:
             info += f"  {var}\n"
         
-        if self.aliases:
-            info += f"Aliases ({len(self.aliases)}):\n"
+        if self._alias_names:
+            info += f"Aliases ({len(self._alias_names)}):\n"
             for alias, var_name in self.aliases.items():
                 info += f"  {alias} → {var_name}\n"
         
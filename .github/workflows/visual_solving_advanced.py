@@ -6,20 +6,83 @@ from variable_system import (
     Solution, Variable, VariableType, ExpressionParser, 
     FormulaEvaluator, register_solution, get_solution, clear_registry
 )
-from typing import Dict, Any, List, Optional, Union, Set
+from typing import Dict, Any, Callable, List, Optional, Union, Set, Tuple
+from functools import lru_cache
+import contextlib
+import io
 import re
+import sys
+
+# Паттерн для legacy ссылок #1.length (компилируется один раз)
+_LEGACY_RE = re.compile(r'#(\d+)\.(\w+)')
+
+# Общий парсер выражений модуля
+_PARSER = ExpressionParser()
+
+# Индекс legacy ID: (legacy_id, variable_name) -> решение, первым объявившее переменную
+_LEGACY_ID_INDEX: Dict[Tuple[int, str], 'HybridSolution'] = {}
+
+# Подписчики на изменения решений (UI обновляется по событию, а не по таймеру).
+# Подписчик получает изменившееся решение или None, если изменилось всё (reset)
+_CHANGE_LISTENERS: List[Callable[[Optional['HybridSolution']], None]] = []
+
+def add_change_listener(listener: Callable[[Optional['HybridSolution']], None]):
+    """Подписаться на изменения решений и переменных"""
+    if listener not in _CHANGE_LISTENERS:
+        _CHANGE_LISTENERS.append(listener)
+
+def remove_change_listener(listener: Callable[[Optional['HybridSolution']], None]):
+    """Отписаться от изменений решений и переменных"""
+    if listener in _CHANGE_LISTENERS:
+        _CHANGE_LISTENERS.remove(listener)
+
+def _notify_changed(solution: Optional['HybridSolution'] = None):
+    """
+    Оповестить подписчиков об изменении решения (None - изменилось всё)
+    
+    Ошибка подписчика (например, удалённого Qt объекта) не влияет ни на
+    остальных подписчиков, ни на результат изменившего модель вызова.
+    """
+    for listener in tuple(_CHANGE_LISTENERS):
+        try:
+            listener(solution)
+        except Exception as e:
+            print(f"Error in change listener {listener!r}: {e}")
+
+@lru_cache(maxsize=4096)
+def _parse_refs_cached(formula: str) -> Tuple[Tuple[str, str], ...]:
+    """Ссылки variable.solution формулы в виде кортежа пар (solution, variable)"""
+    return tuple((ref['solution'], ref['variable']) for ref in _PARSER.find_read_references(formula))
+
+@lru_cache(maxsize=4096)
+def _is_constant_arithmetic(formula: str) -> bool:
+    """Формула без ссылок компилируется в арифметику над числами и функциями вычислителя"""
+    try:
+        code = compile(formula.replace('^', '**'), '<formula>', 'eval')
+    except (SyntaxError, ValueError):
+        return False
+    return all(name in _PARSER.math_functions for name in code.co_names)
 
 class HybridVariable(Variable):
     """
     Гибридная переменная с поддержкой нового и старого синтаксиса
     """
     
+    __slots__ = ('legacy_id', '_folded_value', '_folded_inputs', '_fold_epoch')
+    
     def __init__(self, name: str, value: Union[float, str], 
                  variable_type: VariableType = VariableType.CONTROLLABLE,
                  legacy_id: Optional[int] = None):
         super().__init__(name, value, variable_type)
         self.legacy_id = legacy_id  # Старый #1, #2, #3 ID
         
+        # Свёрнутая константа: значение формулы, все входы которой - числа.
+        # _folded_inputs: ((solution, identifier, variable), ...) на момент свёртки
+        self._folded_value: Optional[float] = None
+        self._folded_inputs: Optional[tuple] = None
+        # Эпоха кэша, в которой формула последний раз оказалась несворачиваемой
+        self._fold_epoch: int = -1
+        
     def get_legacy_reference(self, solution_name: str) -> str:
         """Получение legacy ссылки вида #1.length"""
         if self.legacy_id is not None:
@@ -31,62 +94,99 @@ class HybridFormulaEvaluator(FormulaEvaluator):
     Гибридный вычислитель формул с поддержкой старого и нового синтаксиса
     """
     
+    # Эпоха кэша, общая для всех вычислителей: увеличивается при любом
+    # изменении переменных, алиасов или реестра решений
+    _cache_epoch = 0
+    
     def __init__(self, solutions_registry: Dict[str, 'HybridSolution'] = None):
         super().__init__(solutions_registry)
-        self.legacy_pattern = r'#(\d+)\.(\w+)'  # Паттерн для #1.length
+        # Кэш результатов: (expression, current_solution) -> значение
+        self._eval_cache: Dict[tuple, float] = {}
+        self._cached_epoch = HybridFormulaEvaluator._cache_epoch
+    
+    @classmethod
+    def invalidate_cache(cls):
+        """Сделать недействительными закэшированные результаты во всех вычислителях"""
+        cls._cache_epoch += 1
         
     def evaluate_expression(self, expression: str, current_solution: 'HybridSolution' = None) -> float:
         """
         Вычисление выражения с поддержкой обоих синтаксисов
+        
+        Результат кэшируется до следующего изменения переменных (см. invalidate_cache).
         """
         try:
-            # Сначала обрабатываем legacy синтаксис #1.length
-            expression = self._convert_legacy_references(expression, current_solution)
-            
-            # Затем используем родительский метод для нового синтаксиса
-            return super().evaluate_expression(expression, current_solution)
-            
+            return self._evaluate_checked(expression, current_solution)
         except Exception as e:
             raise ValueError(f"Error evaluating hybrid expression '{expression}': {str(e)}")
     
+    def _evaluate_checked(self, expression: str, current_solution: 'HybridSolution' = None) -> float:
+        """
+        Вычисление выражения без перехвата исключений (для вложенных вычислений)
+        """
+        if self._cached_epoch != HybridFormulaEvaluator._cache_epoch:
+            self._eval_cache.clear()
+            self._cached_epoch = HybridFormulaEvaluator._cache_epoch
+        
+        cache_key = (expression, current_solution)
+        cached = self._eval_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Сначала обрабатываем legacy синтаксис #1.length
+        converted = self._convert_legacy_references(expression, current_solution)
+        
+        # Затем используем родительский метод для нового синтаксиса
+        result = super()._evaluate_checked(converted, current_solution)
+        
+        self._eval_cache[cache_key] = result
+        return result
+    
+    def _get_variable_value(self, var_name: str, solution_name: str) -> Optional[float]:
+        """Получение значения переменной из решения (без перехвата исключений)"""
+        solution = self.solutions_registry.get(solution_name)
+        if isinstance(solution, HybridSolution):
+            return solution._get_value_checked(var_name)
+        return super()._get_variable_value(var_name, solution_name)
+    
     def _convert_legacy_references(self, expression: str, current_solution: 'HybridSolution') -> str:
         """
         Конвертация legacy ссылок #1.length в новый синтаксис variable.solution
         """
-        if not current_solution:
+        # Без '#' legacy ссылок нет - regex не запускаем
+        if not current_solution or '#' not in expression:
             return expression
         
-        # Находим все legacy ссылки
-        legacy_matches = re.finditer(self.legacy_pattern, expression)
-        converted_expression = expression
-        
-        for match in legacy_matches:
+        def replace_legacy_reference(match) -> str:
             legacy_id = int(match.group(1))
             var_name = match.group(2)
-            full_legacy_ref = match.group(0)
             
             # Находим переменную по legacy_id
             target_solution = current_solution._find_solution_by_legacy_id(legacy_id, var_name)
             
             if target_solution:
                 # Заменяем на новый синтаксис
-                new_ref = f"{var_name}.{target_solution.name}"
-                converted_expression = converted_expression.replace(full_legacy_ref, new_ref)
-            else:
-                print(f"Warning: Legacy reference {full_legacy_ref} not found")
+                return sys.intern(f"{var_name}.{target_solution.name}")
+            
+            print(f"Warning: Legacy reference {match.group(0)} not found")
+            return match.group(0)
         
-        return converted_expression
+        # Один проход по выражению: каждая ссылка заменяется на месте
+        return _LEGACY_RE.sub(replace_legacy_reference, expression)
 
 class HybridSolution(Solution):
     """
     Гибридное решение с поддержкой нового и старого синтаксиса
     """
     
+    __slots__ = ('legacy_id_counter', 'legacy_references', '_alias_index')
+    
     def __init__(self, name: str):
         super().__init__(name)
         self.legacy_id_counter = 1  # Счетчик для автоматического назначения legacy ID
         self.evaluator = HybridFormulaEvaluator()
         self.legacy_references: Dict[int, str] = {}  # legacy_id -> variable_name
+        self._alias_index: Dict[str, List[str]] = {}  # variable_name -> [aliases]
         
     def set_variable(self, var_name: str, value: Union[float, str], 
                     variable_type: VariableType = VariableType.CONTROLLABLE,
@@ -95,33 +195,53 @@ class HybridSolution(Solution):
         Установка переменной с автоматическим назначением legacy ID
         """
         try:
-            # Назначаем legacy ID если его нет
-            legacy_id = None
-            if auto_assign_legacy_id:
-                legacy_id = self.legacy_id_counter
-                self.legacy_id_counter += 1
-                self.legacy_references[legacy_id] = var_name
+            HybridFormulaEvaluator.invalidate_cache()
             
-            # Создаем гибридную переменную
-            variable = HybridVariable(var_name, value, variable_type, legacy_id)
+            variable = self._build_variable(var_name, value, variable_type, auto_assign_legacy_id)
+            self.variables[var_name] = variable
             
-            # Обрабатываем зависимости для обоих синтаксисов
+            # Формулу из одних констант сворачиваем сразу
             if isinstance(value, str):
-                # Новый синтаксис
-                references = ExpressionParser().find_read_references(value)
-                for ref in references:
-                    dep_key = f"{ref['solution']}.{ref['variable']}"
-                    variable.add_dependency(dep_key)
-                
-                # Legacy синтаксис - обрабатывается в evaluate_expression
-                variable.variable_type = VariableType.CALCULATED
-            
-            self.variables[var_name] = variable
-            return True
+                self._fold_on_write(variable)
             
         except Exception as e:
             print(f"Error setting hybrid variable {var_name}: {e}")
             return False
+        
+        if _CHANGE_LISTENERS:
+            _notify_changed(self)
+        return True
+    
+    def _build_variable(self, var_name: str, value: Union[float, str],
+                        variable_type: VariableType, auto_assign_legacy_id: bool = True) -> HybridVariable:
+        """
+        Создание гибридной переменной: legacy ID и зависимости (без записи в решение)
+        """
+        # Назначаем legacy ID если его нет
+        legacy_id = None
+        if auto_assign_legacy_id:
+            legacy_id = self.legacy_id_counter
+            self.legacy_id_counter += 1
+            self.legacy_references[legacy_id] = var_name
+            
+            # Запись из сброшенного реестра перезаписываем
+            owner = _LEGACY_ID_INDEX.get((legacy_id, var_name))
+            if owner is None or get_solution(owner.name) is not owner:
+                _LEGACY_ID_INDEX[(legacy_id, var_name)] = self
+        
+        # Создаем гибридную переменную
+        variable = HybridVariable(var_name, value, variable_type, legacy_id)
+        
+        # Обрабатываем зависимости для обоих синтаксисов
+        if isinstance(value, str):
+            # Новый синтаксис
+            for ref_solution, ref_variable in _parse_refs_cached(value):
+                variable.add_dependency(sys.intern(f"{ref_solution}.{ref_variable}"))
+            
+            # Legacy синтаксис - обрабатывается в evaluate_expression
+            variable.variable_type = VariableType.CALCULATED
+        
+        return variable
     
     def set_variable_formula(self, var_name: str, formula: str) -> bool:
         """
@@ -129,6 +249,23 @@ class HybridSolution(Solution):
         """
         return self.set_variable(var_name, formula, VariableType.CALCULATED)
     
+    def set_alias(self, alias: str, var_name: str) -> bool:
+        """
+        Установка алиаса (сбрасывает кэш вычислений)
+        """
+        HybridFormulaEvaluator.invalidate_cache()
+        previous = self.aliases.get(alias)
+        if not super().set_alias(alias, var_name):
+            return False
+        
+        # Обновляем обратный индекс алиасов
+        if previous is not None:
+            self._alias_index[previous].remove(alias)
+        self._alias_index.setdefault(var_name, []).append(alias)
+        if _CHANGE_LISTENERS:
+            _notify_changed(self)
+        return True
+    
     def set_alias_variable(self, alias: str, value: Union[float, str]) -> bool:
         """
         Установка переменной через алиас
@@ -140,6 +277,120 @@ class HybridSolution(Solution):
             self.set_alias(alias, alias)
         return result
     
+    def get_variable_value(self, identifier: str) -> Optional[float]:
+        """
+        Получение значения переменной (со свёрткой констант для формул)
+        
+        Внешняя точка входа: ошибки вложенных вычислений перехватываются здесь один раз.
+        """
+        try:
+            return self._get_value_checked(identifier)
+        except Exception as e:
+            print(f"Error evaluating formula for {identifier}: {e}")
+            return None
+    
+    def _get_value_checked(self, identifier: str) -> Optional[float]:
+        """
+        Получение значения переменной без перехвата исключений
+        """
+        variable = self.variables.get(self.aliases.get(identifier, identifier))
+        if variable is None:
+            return None
+        if not variable.is_formula():
+            return float(variable.value)
+        if not isinstance(variable, HybridVariable):
+            return self.evaluator._evaluate_checked(variable.value, self)
+        
+        if variable._folded_inputs is not None and self._folded_inputs_valid(variable):
+            return variable._folded_value
+        
+        value = self.evaluator._evaluate_checked(variable.value, self)
+        
+        # Входы ищем только после успешного вычисления; несворачиваемую
+        # формулу повторно не проверяем до следующего изменения переменных
+        epoch = HybridFormulaEvaluator._cache_epoch
+        if variable._folded_inputs is not None or variable._fold_epoch != epoch:
+            variable._folded_inputs = self._fold_inputs(variable)
+            variable._folded_value = value
+            variable._fold_epoch = epoch
+        return value
+    
+    def _fold_on_write(self, variable: HybridVariable):
+        """
+        Свёртка формулы при записи: только если все входы - числа
+        
+        Несворачиваемые формулы и строковые значения (например, 'white') не
+        вычисляются; ошибка вычисления откладывается до чтения.
+        """
+        inputs = self._fold_inputs(variable)
+        if inputs is None:
+            return
+        try:
+            value = self.evaluator._evaluate_checked(variable.value, self)
+        except Exception:
+            return
+        variable._folded_value = value
+        variable._folded_inputs = inputs
+    
+    def _fold_inputs(self, variable: HybridVariable) -> Optional[tuple]:
+        """
+        Входы формулы для свёртки констант: ((solution, identifier, variable), ...)
+        
+        None, если хотя бы одна ссылка не разрешается в числовую (не формульную)
+        переменную, а формула без ссылок - не арифметика. Legacy ссылки
+        разрешаются относительно решения - их не сворачиваем.
+        """
+        if '#' in variable.value:
+            return None
+        
+        references = _parse_refs_cached(variable.value)
+        if not references:
+            return () if _is_constant_arithmetic(variable.value) else None
+        
+        inputs = []
+        for ref_solution, ref_variable in references:
+            solution = self.solutions_registry.get(ref_solution)
+            if solution is None:
+                return None
+            dependency = solution.variables.get(solution.aliases.get(ref_variable, ref_variable))
+            if dependency is None or dependency.is_formula():
+                return None
+            inputs.append((solution, ref_variable, dependency))
+        return tuple(inputs)
+    
+    def _folded_inputs_valid(self, variable: HybridVariable) -> bool:
+        """Проверить, что входы свёрнутой формулы не менялись (по идентичности объектов)"""
+        for solution, identifier, dependency in variable._folded_inputs:
+            if self.solutions_registry.get(solution.name) is not solution:
+                return False
+            if solution.variables.get(solution.aliases.get(identifier, identifier)) is not dependency:
+                return False
+        return True
+    
+    def fast_value(self, name: str) -> float:
+        """
+        Быстрое чтение переменной по точному имени (без разбора алиасов)
+        
+        Числа и действующие свёрнутые константы возвращаются без вызова вычислителя.
+        """
+        variable = self.variables[name]
+        if not variable.is_formula():
+            return float(variable.value)
+        if variable._folded_inputs is not None and self._folded_inputs_valid(variable):
+            return variable._folded_value
+        value = self.get_variable_value(name)
+        return 0.0 if value is None else value
+    
+    def get_variable_values(self, names: Tuple[str, ...]) -> Tuple[Optional[float], ...]:
+        """
+        Получение значений нескольких переменных за один вызов
+        
+        Все значения читаются в одной эпохе кэша вычислителя, поэтому общие
+        зависимости формул вычисляются один раз.
+        """
+        get_value = self.get_variable_value
+        return tuple([get_value(name) for name in names])
+    
     def get_legacy_reference(self, var_name: str) -> Optional[str]:
         """Получение legacy ссылки для переменной"""
         if var_name in self.variables:
@@ -157,7 +408,12 @@ class HybridSolution(Solution):
         if legacy_id in self.legacy_references:
             return self
         
-        # Затем проверяем другие решения в реестре
+        # Затем - индекс legacy ID
+        solution = _LEGACY_ID_INDEX.get((legacy_id, var_name))
+        if solution is not None and self.solutions_registry.get(solution.name) is solution:
+            return solution
+        
+        # Запасной путь: просмотр реестра
         for solution in self.solutions_registry.values():
             if isinstance(solution, HybridSolution):
                 if legacy_id in solution.legacy_references:
@@ -172,8 +428,8 @@ class HybridSolution(Solution):
         info = []
         
         for var_name, variable in self.variables.items():
-            # Находим алиасы для этой переменной
-            aliases = [alias for alias, var in self.aliases.items() if var == var_name]
+            # Алиасы этой переменной из обратного индекса
+            aliases = list(self._alias_index.get(var_name, ()))
             
             # Legacy ссылка
             legacy_ref = None
@@ -196,47 +452,63 @@ class HybridSolution(Solution):
         
         return info
 
+# Алиасы размеров коробки: alias -> variable_name
+_BOX_ALIASES = {"L": "length", "W": "width", "H": "height"}
+
 class HybridBoxSolution(HybridSolution):
     """
     Коробка/панель с поддержкой нового синтаксиса
     """
     
+    __slots__ = ()
+    
     def __init__(self, name: str, length: Union[float, str], 
                  width: Union[float, str], height: Union[float, str]):
         super().__init__(name)
+        self._init_box_vars(length, width, height)
+    
+    def _init_box_vars(self, length: Union[float, str],
+                       width: Union[float, str], height: Union[float, str]):
+        """
+        Пакетное создание переменных коробки, алиасов L/W/H и регистрация
         
-        # Создаем базовые переменные
-        self.set_variable("length", length)
-        self.set_variable("width", width) 
-        self.set_variable("height", height)
+        Схема фиксирована, поэтому общая валидация set_variable/set_alias
+        (проверка имён алиасов и существования переменных) не выполняется.
+        """
+        self.variables.update({
+            var_name: self._build_variable(var_name, value, VariableType.CONTROLLABLE)
+            for var_name, value in (("length", length), ("width", width), ("height", height))
+        })
         
         # Создаем удобные алиасы
-        self.set_alias("L", "length")
-        self.set_alias("W", "width")
-        self.set_alias("H", "height")
+        self.aliases.update(_BOX_ALIASES)
+        for alias, var_name in _BOX_ALIASES.items():
+            self._alias_index.setdefault(var_name, []).append(alias)
         
         # Регистрируем в глобальном реестре
         register_solution(self)
+        HybridFormulaEvaluator.invalidate_cache()
     
     @property
     def length(self) -> float:
         """Длина (с автоматическим вычислением формул)"""
-        return self.get_variable_value("length") or 0.0
+        return self.fast_value("length")
     
     @property 
     def width(self) -> float:
         """Ширина (с автоматическим вычислением формул)"""
-        return self.get_variable_value("width") or 0.0
+        return self.fast_value("width")
     
     @property
     def height(self) -> float:
         """Высота (с автоматическим вычислением формул)"""
-        return self.get_variable_value("height") or 0.0
+        return self.fast_value("height")
     
     @property
     def volume(self) -> float:
         """Объем (вычисляемое свойство)"""
-        return self.length * self.width * self.height
+        length, width, height = self.get_variable_values(("length", "width", "height"))
+        return (length or 0.0) * (width or 0.0) * (height or 0.0)
     
     def __str__(self) -> str:
         return f"HybridBoxSolution('{self.name}', {self.length}x{self.width}x{self.height})"
@@ -252,12 +524,17 @@ class SolutionManager:
     def __init__(self):
         self.solutions: Dict[str, HybridSolution] = {}
         self.dependency_tracker = None
+        # Кэш get_global_registry_info, действителен в пределах эпохи вычислителя
+        self._global_info_cache: Optional[List[Dict[str, Any]]] = None
+        self._global_info_epoch = -1
     
     def create_box_solution(self, name: str, length: Union[float, str], 
                            width: Union[float, str], height: Union[float, str]) -> HybridBoxSolution:
         """Создание решения-коробки"""
         solution = HybridBoxSolution(name, length, width, height)
         self.solutions[name] = solution
+        if _CHANGE_LISTENERS:
+            _notify_changed(solution)
         return solution
     
     def get_solution(self, name: str) -> Optional[HybridSolution]:
@@ -272,9 +549,22 @@ class SolutionManager:
         """Сброс всех решений"""
         self.solutions.clear()
         clear_registry()
+        _LEGACY_ID_INDEX.clear()
+        HybridFormulaEvaluator.invalidate_cache()
+        if _CHANGE_LISTENERS:
+            _notify_changed()
     
     def get_global_registry_info(self) -> List[Dict[str, Any]]:
-        """Получение информации о всех переменных во всех решениях"""
+        """
+        Получение информации о всех переменных во всех решениях
+        
+        Результат кэшируется до следующего изменения переменных, алиасов или
+        решений (эпоха HybridFormulaEvaluator) - возвращаемый список не изменять.
+        """
+        epoch = HybridFormulaEvaluator._cache_epoch
+        if self._global_info_cache is not None and self._global_info_epoch == epoch:
+            return self._global_info_cache
+        
         all_variables = []
         
         for solution_name, solution in self.solutions.items():
@@ -282,113 +572,124 @@ class SolutionManager:
                 var_info['solution_name'] = solution_name
                 all_variables.append(var_info)
         
+        self._global_info_cache = all_variables
+        self._global_info_epoch = epoch
         return all_variables
 
 # Глобальный менеджер решений
 solution_manager = SolutionManager()
 
-def demo_hybrid_system():
+def demo_hybrid_system(out=None):
     """
     Демонстрация гибридной системы с поддержкой обоих синтаксисов
+    
+    Вывод накапливается в буфере и пишется в out (по умолчанию stdout) одним вызовом.
     """
-    print("🚀 ДЕМОНСТРАЦИЯ ГИБРИДНОЙ СИСТЕМЫ")
-    print("Поддержка НОВОГО и СТАРОГО синтаксиса")
-    print("=" * 50)
-    
-    # Сброс системы
-    solution_manager.reset()
-    
-    print("\n1. Создание решений с новым синтаксисом:")
-    
-    # Создаем панель
-    panel = solution_manager.create_box_solution("panel", 600, 400, 18)
-    print(f"   panel = HybridBoxSolution('panel', 600, 400, 18)")
-    print(f"   ✅ Создано: {panel}")
-    
-    print("\n2. Автоматические legacy ID и алиасы:")
-    for var_info in panel.get_all_variables_info():
-        print(f"   • {var_info['write_id']} = {var_info['value']}")
-        print(f"     Legacy: {var_info['legacy_id']}")
-        print(f"     Read: {var_info['read_id']}")
-        print(f"     Aliases: {var_info['aliases']}")
-    
-    print("\n3. Создание зависимого решения с НОВЫМ синтаксисом:")
-    result = solution_manager.create_box_solution(
-        "result",
-        "length.panel",           # Новый синтаксис
-        "width.panel - 20",       # Формула с новым синтаксисом
-        "height.panel"            # Новый синтаксис
-    )
-    print(f"   result = HybridBoxSolution('result', 'length.panel', 'width.panel - 20', 'height.panel')")
-    print(f"   ✅ Создано: {result}")
-    
-    print("\n4. Создание решения с LEGACY синтаксисом:")
-    legacy_result = HybridBoxSolution("legacy_result", "#1.length", "#2.width - 10", "#3.height")
-    print(f"   legacy_result = HybridBoxSolution('legacy_result', '#1.length', '#2.width - 10', '#3.height')")
-    print(f"   ✅ Создано: {legacy_result}")
-    
-    print("\n5. Смешанный синтаксис в одной формуле:")
-    mixed = HybridBoxSolution(
-        "mixed",
-        "length.panel + #1.length",  # Новый + Legacy
-        "max(width.panel, #2.width)", # Функция с разными синтаксисами
-        "18"
-    )
-    print(f"   mixed = формула с новым и legacy синтаксисом")
-    print(f"   ✅ Создано: {mixed}")
-    
-    print("\n6. Результаты вычислений:")
-    all_solutions = solution_manager.get_all_solutions()
-    
-    for sol in all_solutions:
-        print(f"\n   📦 {sol.name.upper()}:")
-        print(f"      Размеры: {sol.length:.1f} x {sol.width:.1f} x {sol.height:.1f}")
-        print(f"      Объем: {sol.volume:.1f}")
-        
-        # Показываем формулы
-        for var_info in sol.get_all_variables_info():
-            if var_info['is_formula']:
-                print(f"      {var_info['name']}: {var_info['raw_value']} = {var_info['value']:.1f}")
-    
-    print("\n7. Демонстрация автоматического обновления:")
-    print("   Изменяем length@panel с 600 на 800...")
-    panel.set_variable("length", 800)
-    
-    print("\n   📊 ОБНОВЛЕННЫЕ РЕЗУЛЬТАТЫ:")
-    for sol in all_solutions:
-        print(f"   {sol.name}: {sol.length:.1f} x {sol.width:.1f} x {sol.height:.1f}")
-    
-    print("\n8. Работа с алиасами:")
-    print("   Устанавливаем L = 1000 через алиас...")
-    panel.set_alias_variable("L", 1000)
-    
-    print(f"   ✅ panel.L (алиас) = {panel.get_variable_value('L')}")
-    print(f"   ✅ panel.length = {panel.get_variable_value('length')}")
-    print(f"   ✅ result.length = {result.length} (обновилось автоматически)")
-    
-    print("\n9. Глобальный реестр переменных:")
-    global_info = solution_manager.get_global_registry_info()
-    
-    print(f"   Всего переменных в системе: {len(global_info)}")
-    print("   Детальная информация:")
-    
-    for var_info in global_info:
-        solution_name = var_info['solution_name']
-        var_name = var_info['name']
-        value = var_info['value']
-        legacy = var_info.get('legacy_id', 'N/A')
-        
-        print(f"   • {solution_name}.{var_name} = {value:.1f} (legacy: {legacy})")
-    
-    print("\n🎉 ДЕМОНСТРАЦИЯ ГИБРИДНОЙ СИСТЕМЫ ЗАВЕРШЕНА!")
-    print("\nВозможности гибридной системы:")
-    print("✅ Новый синтаксис: variable@solution и variable.solution")
-    print("✅ Legacy поддержка: #1.length продолжает работать")
-    print("✅ Смешанные формулы: новый + legacy в одном выражении")
-    print("✅ Автоматические legacy ID: совместимость с существующими проектами")
-    print("✅ Безопасные алиасы: L, W, H изолированы в каждом решении")
-    print("✅ Умные зависимости: автоматический пересчет при изменениях")
-    print("✅ Глобальный реестр: централизованное управление переменными")
+    buf = io.StringIO()
+    
+    # Сообщения библиотеки (ошибки вычисления формул, предупреждения) тоже
+    # попадают в буфер - на своё место среди шагов демонстрации
+    with contextlib.redirect_stdout(buf):
+        print("🚀 ДЕМОНСТРАЦИЯ ГИБРИДНОЙ СИСТЕМЫ")
+        print("Поддержка НОВОГО и СТАРОГО синтаксиса")
+        print("=" * 50)
+        
+        # Сброс системы
+        solution_manager.reset()
+        
+        print("\n1. Создание решений с новым синтаксисом:")
+        
+        # Создаем панель
+        panel = solution_manager.create_box_solution("panel", 600, 400, 18)
+        print(f"   panel = HybridBoxSolution('panel', 600, 400, 18)")
+        print(f"   ✅ Создано: {panel}")
+        
+        print("\n2. Автоматические legacy ID и алиасы:")
+        for var_info in panel.get_all_variables_info():
+            print(f"   • {var_info['write_id']} = {var_info['value']}")
+            print(f"     Legacy: {var_info['legacy_id']}")
+            print(f"     Read: {var_info['read_id']}")
+            print(f"     Aliases: {var_info['aliases']}")
+        
+        print("\n3. Создание зависимого решения с НОВЫМ синтаксисом:")
+        result = solution_manager.create_box_solution(
+            "result",
+            "length.panel",           # Новый синтаксис
+            "width.panel - 20",       # Формула с новым синтаксисом
+            "height.panel"            # Новый синтаксис
+        )
+        print(f"   result = HybridBoxSolution('result', 'length.panel', 'width.panel - 20', 'height.panel')")
+        print(f"   ✅ Создано: {result}")
+        
+        print("\n4. Создание решения с LEGACY синтаксисом:")
+        legacy_result = HybridBoxSolution("legacy_result", "#1.length", "#2.width - 10", "#3.height")
+        print(f"   legacy_result = HybridBoxSolution('legacy_result', '#1.length', '#2.width - 10', '#3.height')")
+        print(f"   ✅ Создано: {legacy_result}")
+        
+        print("\n5. Смешанный синтаксис в одной формуле:")
+        mixed = HybridBoxSolution(
+            "mixed",
+            "length.panel + #1.length",  # Новый + Legacy
+            "max(width.panel, #2.width)", # Функция с разными синтаксисами
+            "18"
+        )
+        print(f"   mixed = формула с новым и legacy синтаксисом")
+        print(f"   ✅ Создано: {mixed}")
+        
+        print("\n6. Результаты вычислений:")
+        all_solutions = solution_manager.get_all_solutions()
+        
+        for sol in all_solutions:
+            print(f"\n   📦 {sol.name.upper()}:")
+            print(f"      Размеры: {sol.length:.1f} x {sol.width:.1f} x {sol.height:.1f}")
+            print(f"      Объем: {sol.volume:.1f}")
+            
+            # Показываем формулы
+            for var_info in sol.get_all_variables_info():
+                if var_info['is_formula']:
+                    print(f"      {var_info['name']}: {var_info['raw_value']} = {var_info['value']:.1f}")
+        
+        print("\n7. Демонстрация автоматического обновления:")
+        print("   Изменяем length@panel с 600 на 800...")
+        panel.set_variable("length", 800)
+        
+        print("\n   📊 ОБНОВЛЕННЫЕ РЕЗУЛЬТАТЫ:")
+        for sol in all_solutions:
+            print(f"   {sol.name}: {sol.length:.1f} x {sol.width:.1f} x {sol.height:.1f}")
+        
+        print("\n8. Работа с алиасами:")
+        print("   Устанавливаем L = 1000 через алиас...")
+        panel.set_alias_variable("L", 1000)
+        
+        print(f"   ✅ panel.L (алиас) = {panel.get_variable_value('L')}")
+        print(f"   ✅ panel.length = {panel.get_variable_value('length')}")
+        print(f"   ✅ result.length = {result.length} (обновилось автоматически)")
+        
+        print("\n9. Глобальный реестр переменных:")
+        global_info = solution_manager.get_global_registry_info()
+        
+        print(f"   Всего переменных в системе: {len(global_info)}")
+        print("   Детальная информация:")
+        
+        for var_info in global_info:
+            solution_name = var_info['solution_name']
+            var_name = var_info['name']
+            value = var_info['value']
+            legacy = var_info.get('legacy_id', 'N/A')
+            
+            print(f"   • {solution_name}.{var_name} = {value:.1f} (legacy: {legacy})")
+        
+        print("\n🎉 ДЕМОНСТРАЦИЯ ГИБРИДНОЙ СИСТЕМЫ ЗАВЕРШЕНА!")
+        print("\nВозможности гибридной системы:")
+        print("✅ Новый синтаксис: variable@solution и variable.solution")
+        print("✅ Legacy поддержка: #1.length продолжает работать")
+        print("✅ Смешанные формулы: новый + legacy в одном выражении")
+        print("✅ Автоматические legacy ID: совместимость с существующими проектами")
+        print("✅ Безопасные алиасы: L, W, H изолированы в каждом решении")
+        print("✅ Умные зависимости: автоматический пересчет при изменениях")
+        print("✅ Глобальный реестр: централизованное управление переменными")
+    
+    (out or sys.stdout).write(buf.getvalue())
 
 if __name__ == "__main__":
     demo_hybrid_system()
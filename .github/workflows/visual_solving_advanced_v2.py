@@ -2,10 +2,13 @@
 # Исправленная версия с правильным порядком создания переменных
 
 import re
-from typing import Dict, List, Set, Optional, Union, Tuple, Any
+from typing import Dict, List, Set, FrozenSet, Optional, Union, Tuple, Any, NamedTuple
 from enum import Enum
-import uuid
 import json
+import itertools
+from collections import defaultdict, deque
+import sys
+import warnings
 
 # Импорт новой системы V2
 try:
@@ -18,6 +21,10 @@ except ImportError as e:
     print(f"Ошибка импорта V2 системы: {e}")
     V2_AVAILABLE = False
 
+# Трассировка переменных: HybridSolution.debug_variables() пишет в stdout,
+# только если флаг включён (UI вызывает её при каждом создании решения)
+DEBUG_VARIABLES = False
+
 # =============================================================================
 # Типы переменных и зависимостей
 # =============================================================================
@@ -43,20 +50,43 @@ class IntegrationType(Enum):
 class HybridVariable:
     """Переменная, поддерживающая и V2, и Legacy синтаксис"""
     
+    __slots__ = ('name', 'solution_name', 'variable_id', 'var_type', 'aliases', '_alias_set',
+                 'v2_variable', '_value', '_cached_value', '_dirty',
+                 'legacy_id', 'legacy_full_id', 'new_write_id', 'new_read_id')
+    
     def __init__(self, name: str, value: any, var_type: VariableType, 
-                 solution_name: str, variable_id: int, aliases: List[str] = None):
+                 solution_name: str, variable_id: int, aliases: List[str] = None,
+                 v2_variable: Optional['V2Variable'] = None):
         self.name = name
         self.solution_name = solution_name
         self.variable_id = variable_id  # Legacy #number
         self.var_type = var_type
         self.aliases = aliases or []
+        self._alias_set = frozenset(self.aliases)  # Для проверки членства за O(1)
         
-        # V2 переменная (создаётся автоматически)
-        if V2_AVAILABLE:
+        # ID строятся один раз и интернируются: имя, решение и номер не меняются
+        self.legacy_id = sys.intern(f"#{variable_id}")                    # #number
+        self.legacy_full_id = sys.intern(f"#{variable_id}.{name}")        # #number.name
+        self.new_write_id = sys.intern(f"{name}@{solution_name}")         # variable@solution
+        self.new_read_id = sys.intern(f"{name}.{solution_name}")          # variable.solution
+        
+        # Кэш вычисленного значения с флагом устаревания
+        self._cached_value: any = 0.0
+        self._dirty: bool = True
+        
+        # V2 переменная (общая с V2 решением или создаётся автоматически)
+        if v2_variable is not None:
+            self.v2_variable = v2_variable
+        elif V2_AVAILABLE:
             self.v2_variable = V2Variable(name, value, solution_name)
         else:
             self.v2_variable = None
             self._value = value
+        
+        # Запись в V2 переменную любым путём (в том числе V2Solution.execute_expression
+        # из UI) обновляет граф зависимостей и сбрасывает кэш
+        if self.v2_variable is not None:
+            self.v2_variable.on_change = self._on_v2_changed
     
     @property
     def value(self) -> any:
@@ -69,29 +99,37 @@ class HybridVariable:
     def value(self, new_value):
         """Установить значение переменной"""
         if self.v2_variable:
-            self.v2_variable.value = new_value
+            self.v2_variable.value = new_value  # invalidate() - через _on_v2_changed
         else:
             self._value = new_value
+            self.invalidate()
     
-    @property
-    def legacy_id(self) -> str:
-        """Legacy ID: #number"""
-        return f"#{self.variable_id}"
-    
-    @property
-    def legacy_full_id(self) -> str:
-        """Legacy полный ID: #number.name"""
-        return f"#{self.variable_id}.{self.name}"
+    def _on_v2_changed(self):
+        """Значение или формула V2 переменной изменились"""
+        v2_variable = self.v2_variable
+        if v2_variable.is_formula:
+            resolve = v2_solution_manager.resolve_read_id
+            dependencies = frozenset(resolve(dep) for dep in v2_variable.dependencies)
+        else:
+            dependencies = _EMPTY_IDS
+        
+        # Повторная запись той же формулы не меняет граф - не сбрасываем его кэши
+        if v2_dependency_tracker.get_dependencies(self.new_read_id) != dependencies:
+            # Цикл не запрещаем (пересчёт его не зациклит), но предупреждаем
+            if dependencies and v2_dependency_tracker.has_circular_dependency(self.new_read_id, dependencies):
+                warnings.warn(f"Circular dependency in {self.new_write_id} = {v2_variable.formula}",
+                              CircularDependencyWarning, stacklevel=2)
+            v2_dependency_tracker.add_dependency(self.new_read_id, dependencies)
+        self.invalidate()
     
-    @property
-    def new_write_id(self) -> str:
-        """Новый ID для записи: variable@solution"""
-        return f"{self.name}@{self.solution_name}"
+    def has_alias(self, alias: str) -> bool:
+        """Является ли alias алиасом этой переменной"""
+        return alias in self._alias_set
     
-    @property
-    def new_read_id(self) -> str:
-        """Новый ID для чтения: variable.solution"""
-        return f"{self.name}.{self.solution_name}"
+    def invalidate(self):
+        """Пометить переменную и все зависящие от неё переменные как устаревшие"""
+        self._dirty = True
+        v2_solution_manager.invalidate_dependents(self.new_read_id)
     
     def set_formula(self, formula: str, solution_registry: Dict[str, 'V2Solution']):
         """Установить формулу V2"""
@@ -99,10 +137,34 @@ class HybridVariable:
             self.v2_variable.set_formula(formula, solution_registry)
     
     def get_computed_value(self, solution_registry: Dict[str, 'V2Solution'] = None) -> any:
-        """Вычислить значение формулы"""
+        """Вычислить значение формулы (пересчёт только если значение устарело)"""
+        if not self._dirty:
+            return self._cached_value
+        
+        if v2_solution_manager.recompute_pending:
+            v2_solution_manager.recompute_all(solution_registry)
+            if not self._dirty:
+                return self._cached_value
+        
+        # Снимаем флаг заранее, чтобы циклическая зависимость не зациклила пересчёт
+        self._dirty = False
+        
         if self.v2_variable:
-            return self.v2_variable.get_computed_value(solution_registry)
-        return self.value
+            if solution_registry is None:
+                solution_registry = v2_solution_manager.get_all_solutions()
+            
+            if self.v2_variable.is_formula:
+                # Сначала обновляем устаревшие зависимости
+                for dep_id in v2_dependency_tracker.get_dependencies(self.new_read_id):
+                    dependency = v2_solution_manager.get_variable_by_read_id(dep_id)
+                    if dependency and dependency._dirty:
+                        dependency.get_computed_value(solution_registry)
+            
+            self._cached_value = self.v2_variable.get_computed_value(solution_registry)
+        else:
+            self._cached_value = self.value
+        
+        return self._cached_value
     
     def __str__(self):
         return f"HybridVar({self.new_write_id} = {self.value}, legacy: {self.legacy_id})"
@@ -114,9 +176,12 @@ class HybridVariable:
 class V2SolutionManager:
     """Менеджер для управления решениями V2"""
     
+    __slots__ = ('solutions', 'v2_solutions', 'recompute_pending')
+    
     def __init__(self):
         self.solutions: Dict[str, 'HybridSolution'] = {}
         self.v2_solutions: Dict[str, V2Solution] = {}
+        self.recompute_pending = False  # Есть несколько устаревших переменных
     
     def register_solution(self, solution: 'HybridSolution'):
         """Зарегистрировать решение"""
@@ -132,10 +197,72 @@ class V2SolutionManager:
         """Получить все V2 решения для формул"""
         return self.v2_solutions
     
+    def get_variable_by_read_id(self, read_id: str) -> Optional[HybridVariable]:
+        """Получить гибридную переменную по ID чтения variable.solution"""
+        var_name, _, solution_name = read_id.partition('.')
+        solution = self.solutions.get(solution_name)
+        return solution.variables.get(var_name) if solution else None
+    
+    def invalidate_dependents(self, read_id: str):
+        """Пометить устаревшими все переменные, зависящие от read_id (обход в ширину)"""
+        seen = {read_id}
+        pending = deque(seen)
+        while pending:
+            for dependent_id in v2_dependency_tracker.get_dependent_variables(pending.popleft()):
+                if dependent_id in seen:
+                    continue
+                seen.add(dependent_id)
+                dependent = self.get_variable_by_read_id(dependent_id)
+                if dependent:
+                    dependent._dirty = True
+                pending.append(dependent_id)
+        
+        # Устарело несколько переменных - пересчитаем их одним проходом при чтении
+        if len(seen) > 1:
+            self.recompute_pending = True
+    
+    def resolve_read_id(self, read_id: str) -> str:
+        """
+        Привести ID чтения к имени переменной: L.p -> length.p
+        
+        Граф зависимостей хранит рёбра только под настоящими ID, иначе
+        invalidate() не дойдёт до формул, читающих переменную через алиас.
+        Неразрешимые ссылки возвращаются как есть.
+        """
+        var_name, _, solution_name = read_id.partition('.')
+        solution = self.solutions.get(solution_name)
+        if solution is not None:
+            var = solution.get_variable_by_reference(var_name)
+            if var is not None:
+                return var.new_read_id
+            # Переменная только V2 слоя (например, из execute_v2_expression)
+            if solution.v2_solution is not None:
+                v2_var = solution.v2_solution.get_variable(var_name)
+                if v2_var is not None:
+                    return sys.intern(v2_var.read_id)
+        return read_id
+    
+    def recompute_all(self, solution_registry: Dict[str, V2Solution] = None):
+        """
+        Пересчитать все устаревшие переменные одним проходом снизу вверх
+        
+        Порядок - топологический (зависимости раньше зависимых), поэтому
+        каждая общая зависимость вычисляется один раз за эпоху.
+        """
+        self.recompute_pending = False
+        if solution_registry is None:
+            solution_registry = self.v2_solutions
+        
+        for read_id in v2_dependency_tracker.topological_order():
+            variable = self.get_variable_by_read_id(read_id)
+            if variable and variable._dirty:
+                variable.get_computed_value(solution_registry)
+    
     def reset(self):
         """Сбросить все решения"""
         self.solutions.clear()
         self.v2_solutions.clear()
+        self.recompute_pending = False
 
 # Глобальный менеджер решений V2
 v2_solution_manager = V2SolutionManager()
@@ -144,53 +271,160 @@ v2_solution_manager = V2SolutionManager()
 # Трекер зависимостей V2
 # =============================================================================
 
+_EMPTY_IDS: FrozenSet[str] = frozenset()
+
+class CircularDependencyWarning(UserWarning):
+    """Формула замыкает цикл зависимостей (отключается фильтром warnings)"""
+
 class V2DependencyTracker:
     """Отслеживание зависимостей между переменными V2"""
     
+    __slots__ = ('dependency_graph', 'reverse_dependencies', '_frozen_dependents', '_topological_order')
+    
     def __init__(self):
-        self.dependency_graph: Dict[str, Set[str]] = {}  # variable.solution -> dependencies
+        self.dependency_graph: Dict[str, FrozenSet[str]] = {}  # variable.solution -> dependencies
         self.reverse_dependencies: Dict[str, Set[str]] = {}  # variable.solution -> dependents
+        # Неизменяемые снимки обратных зависимостей, общие для всех читателей
+        self._frozen_dependents: Dict[str, FrozenSet[str]] = {}
+        self._topological_order: Optional[List[str]] = None
     
     def add_dependency(self, variable_id: str, dependencies: Set[str]):
         """Добавить зависимости для переменной"""
+        variable_id = sys.intern(variable_id)
+        dependencies = frozenset(dependencies)
         self.dependency_graph[variable_id] = dependencies
+        self._topological_order = None
         
         # Обновляем обратные зависимости
         for dep in dependencies:
             if dep not in self.reverse_dependencies:
                 self.reverse_dependencies[dep] = set()
             self.reverse_dependencies[dep].add(variable_id)
+            self._frozen_dependents.pop(dep, None)
+    
+    def get_dependencies(self, variable_id: str) -> FrozenSet[str]:
+        """Получить зависимости переменной (неизменяемый снимок)"""
+        return self.dependency_graph.get(variable_id, _EMPTY_IDS)
     
-    def get_dependencies(self, variable_id: str) -> Set[str]:
-        """Получить зависимости переменной"""
-        return self.dependency_graph.get(variable_id, set())
+    def get_dependent_variables(self, variable_id: str) -> FrozenSet[str]:
+        """Получить переменные, зависящие от данной (неизменяемый снимок)"""
+        frozen = self._frozen_dependents.get(variable_id)
+        if frozen is None:
+            dependents = self.reverse_dependencies.get(variable_id)
+            if not dependents:
+                return _EMPTY_IDS
+            frozen = self._frozen_dependents[variable_id] = frozenset(dependents)
+        return frozen
     
-    def get_dependent_variables(self, variable_id: str) -> Set[str]:
-        """Получить переменные, зависящие от данной"""
-        return self.reverse_dependencies.get(variable_id, set())
+    def topological_order(self) -> List[str]:
+        """
+        Порядок вычисления: зависимости раньше зависимых (алгоритм Кана)
+        
+        Переменные, входящие в циклы, в порядок не попадают.
+        Результат кэшируется до следующего изменения графа.
+        """
+        if self._topological_order is not None:
+            return self._topological_order
+        
+        remaining: Dict[str, int] = {}
+        for var_id, deps in self.dependency_graph.items():
+            remaining[var_id] = len(deps)
+            for dep in deps:
+                remaining.setdefault(dep, 0)
+        
+        ready = deque(var_id for var_id, count in remaining.items() if count == 0)
+        order: List[str] = []
+        while ready:
+            var_id = ready.popleft()
+            order.append(var_id)
+            for dependent_id in self.reverse_dependencies.get(var_id, ()):
+                # Обратные связи могут остаться от прежней формулы - сверяемся с графом
+                if var_id not in self.dependency_graph.get(dependent_id, ()):
+                    continue
+                remaining[dependent_id] -= 1
+                if remaining[dependent_id] == 0:
+                    ready.append(dependent_id)
+        
+        self._topological_order = order
+        return order
     
     def has_circular_dependency(self, variable_id: str, dependencies: Set[str]) -> bool:
-        """Проверить наличие циклических зависимостей"""
-        visited = set()
+        """
+        Проверить наличие циклических зависимостей
         
-        def check_circular(var_id: str, path: Set[str]) -> bool:
-            if var_id in path:
-                return True
-            if var_id in visited:
-                return False
-            
-            visited.add(var_id)
-            path.add(var_id)
-            
-            var_deps = self.dependency_graph.get(var_id, set())
-            for dep in var_deps:
-                if check_circular(dep, path):
+        Итеративный DFS с раскраской (белый/серый/чёрный): зависимости
+        variable_id берутся из аргумента dependencies, остальные - из графа.
+        """
+        WHITE, GRAY, BLACK = 0, 1, 2
+        color: Dict[str, int] = {variable_id: GRAY}
+        stack = [(variable_id, iter(dependencies))]
+        
+        while stack:
+            var_id, deps_iter = stack[-1]
+            for dep in deps_iter:
+                dep_color = color.get(dep, WHITE)
+                if dep_color == GRAY:
                     return True
+                if dep_color == WHITE:
+                    color[dep] = GRAY
+                    stack.append((dep, iter(self.dependency_graph.get(dep, ()))))
+                    break
+            else:
+                color[var_id] = BLACK
+                stack.pop()
+        
+        return False
+    
+    def detect_cycles(self) -> List[List[str]]:
+        """
+        Найти все циклы графа за один проход (итеративный алгоритм Тарьяна)
+        
+        Возвращает компоненты сильной связности, образующие циклы.
+        """
+        index: Dict[str, int] = {}
+        lowlink: Dict[str, int] = {}
+        on_stack: Set[str] = set()
+        scc_stack: List[str] = []
+        cycles: List[List[str]] = []
+        
+        for root in self.dependency_graph:
+            if root in index:
+                continue
+            
+            index[root] = lowlink[root] = len(index)
+            scc_stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self.dependency_graph.get(root, ())))]
             
-            path.remove(var_id)
-            return False
+            while work:
+                var_id, deps_iter = work[-1]
+                for dep in deps_iter:
+                    if dep not in index:
+                        index[dep] = lowlink[dep] = len(index)
+                        scc_stack.append(dep)
+                        on_stack.add(dep)
+                        work.append((dep, iter(self.dependency_graph.get(dep, ()))))
+                        break
+                    if dep in on_stack:
+                        lowlink[var_id] = min(lowlink[var_id], index[dep])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[var_id])
+                    
+                    if lowlink[var_id] == index[var_id]:
+                        component = []
+                        while True:
+                            member = scc_stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == var_id:
+                                break
+                        if len(component) > 1 or var_id in self.dependency_graph.get(var_id, ()):
+                            cycles.append(component)
         
-        return check_circular(variable_id, set())
+        return cycles
 
 # Глобальный трекер зависимостей
 v2_dependency_tracker = V2DependencyTracker()
@@ -199,34 +433,64 @@ v2_dependency_tracker = V2DependencyTracker()
 # Глобальный реестр переменных V2
 # =============================================================================
 
+class VarInfo(NamedTuple):
+    """Информация о переменной для глобального реестра"""
+    name: str
+    solution_name: str
+    value: Any
+    type: str
+    variable_id: int
+    legacy_id: str
+    legacy_full_id: str
+    new_write_id: str
+    new_read_id: str
+    aliases: List[str]
+    is_formula: bool
+    formula: Optional[str]
+    computed_value: Any
+    dependencies: Tuple[str, ...]
+    dependents: FrozenSet[str]
+    
+    def as_dict(self) -> Dict[str, Any]:
+        """Преобразовать в словарь (для экспорта в JSON)"""
+        info = self._asdict()
+        info['aliases'] = list(self.aliases)
+        info['dependencies'] = list(self.dependencies)
+        info['dependents'] = list(self.dependents)
+        return info
+
 class V2GlobalVariableRegistry:
     """Глобальный реестр всех переменных V2 в системе"""
     
     @staticmethod
-    def get_all_variables_info() -> List[Dict[str, any]]:
+    def get_all_variables_info() -> List[VarInfo]:
         """Получить информацию о всех переменных в системе"""
         variables_info = []
+        get_dependents = v2_dependency_tracker.get_dependent_variables
         
         for solution_name, solution in v2_solution_manager.solutions.items():
             for var in solution.get_all_variables():
-                var_info = {
-                    'name': var.name,
-                    'solution_name': solution_name,
-                    'value': var.value,
-                    'type': var.var_type.value,
-                    'variable_id': var.variable_id,
-                    'legacy_id': var.legacy_id,
-                    'legacy_full_id': var.legacy_full_id,
-                    'new_write_id': var.new_write_id,
-                    'new_read_id': var.new_read_id,
-                    'aliases': var.aliases,
-                    'is_formula': var.v2_variable.is_formula if var.v2_variable else False,
-                    'formula': var.v2_variable.formula if var.v2_variable and var.v2_variable.is_formula else None,
-                    'computed_value': var.get_computed_value() if var.v2_variable and var.v2_variable.is_formula else var.value,
-                    'dependencies': list(var.v2_variable.dependencies) if var.v2_variable else [],
-                    'dependents': list(v2_dependency_tracker.get_dependent_variables(var.new_read_id))
-                }
-                variables_info.append(var_info)
+                v2_var = var.v2_variable
+                is_formula = v2_var.is_formula if v2_var else False
+                value = var.value
+                read_id = var.new_read_id
+                variables_info.append(VarInfo(
+                    var.name,
+                    solution_name,
+                    value,
+                    var.var_type.value,
+                    var.variable_id,
+                    var.legacy_id,
+                    var.legacy_full_id,
+                    var.new_write_id,
+                    read_id,
+                    var.aliases,
+                    is_formula,
+                    v2_var.formula if is_formula else None,
+                    var.get_computed_value() if is_formula else value,
+                    tuple(v2_var.dependencies) if v2_var else (),
+                    get_dependents(read_id)
+                ))
         
         return variables_info
     
@@ -243,16 +507,38 @@ class V2GlobalVariableRegistry:
 # Базовое гибридное решение (V2 + Legacy)
 # =============================================================================
 
+# Счётчик ID решений и пространств: ID нужны только внутри процесса
+_id_counter = itertools.count(1)
+
+# Legacy ссылка #number[.name]
+_REF_RE = re.compile(r'^#(\d+)(?:\.(.+))?$')
+
+def _watch_v2_variable(v2_variable: 'V2Variable'):
+    """
+    Подписать переменную V2 решения на сброс кэшей зависящих от неё формул
+    
+    Нужно переменным только V2 слоя (foo@p=5 через execute_v2_expression):
+    у них нет HybridVariable, чей _on_v2_changed вызвал бы invalidate().
+    Гибридная переменная поверх V2 переменной заменяет этот обработчик своим.
+    """
+    read_id = sys.intern(v2_variable.read_id)
+    v2_variable.on_change = lambda: v2_solution_manager.invalidate_dependents(read_id)
+
 class HybridSolution:
     """Базовое решение с поддержкой V2 и Legacy синтаксиса"""
     
+    __slots__ = ('name', 'solution_id', 'v2_solution', 'variables', 'next_variable_id',
+                 '_by_id', '_by_alias', '_ref_cache', '_v2_to_hybrid',
+                 'attributes', 'parent_solutions', 'child_solutions', 'containing_space')
+    
     def __init__(self, name: str):
         self.name = name
-        self.solution_id = str(uuid.uuid4())
+        self.solution_id = f"sol-{next(_id_counter)}"
         
         # V2 система
         if V2_AVAILABLE:
             self.v2_solution = V2Solution(name)
+            self.v2_solution.on_variable_created = _watch_v2_variable
         else:
             self.v2_solution = None
         
@@ -260,6 +546,12 @@ class HybridSolution:
         self.variables: Dict[str, HybridVariable] = {}
         self.next_variable_id = 1
         
+        # Индексы для разрешения ссылок без перебора переменных
+        self._by_id: Dict[int, HybridVariable] = {}      # legacy #number -> переменная
+        self._by_alias: Dict[str, HybridVariable] = {}   # legacy алиас -> переменная
+        self._ref_cache: Dict[str, HybridVariable] = {}  # ссылка -> найденная переменная
+        self._v2_to_hybrid: Dict[int, HybridVariable] = {}  # id(V2 переменной) -> переменная
+        
         # Метаданные
         self.attributes: Dict[str, any] = {}
         self.parent_solutions: List['HybridSolution'] = []
@@ -271,71 +563,94 @@ class HybridSolution:
     
     def create_variable(self, name: str, value: any, var_type: VariableType, aliases: List[str] = None) -> HybridVariable:
         """Создать переменную с поддержкой V2 и Legacy"""
-        aliases = aliases or []
-        
-        # Создаём V2 переменную сначала
-        if self.v2_solution:
-            self.v2_solution.create_variable(name, value)
+        return self.create_variables([(name, value, var_type, aliases)])[0]
+    
+    def create_variables(self, specs: List[Tuple[str, Any, VariableType, Optional[List[str]]]]) -> List[HybridVariable]:
+        """
+        Создать несколько переменных за один вызов
         
-        # Создаём гибридную переменную
-        hybrid_var = HybridVariable(name, value, var_type, self.name, self.next_variable_id, aliases)
-        self.variables[name] = hybrid_var
-        self.next_variable_id += 1
+        specs: [(name, value, var_type, aliases), ...]. Связанные методы и
+        словари извлекаются один раз на весь пакет.
+        """
+        v2 = self.v2_solution
+        v2_create = v2.create_variable if v2 else None
+        v2_set_alias = v2.set_alias if v2 else None
+        variables = self.variables
+        by_id = self._by_id
+        by_alias = self._by_alias
+        v2_to_hybrid = self._v2_to_hybrid
+        created = []
         
-        # Устанавливаем алиасы ПОСЛЕ создания переменной
-        if self.v2_solution and aliases:
+        for name, value, var_type, aliases in specs:
+            aliases = aliases or []
+            
+            # Создаём V2 переменную сначала
+            v2_variable = v2_create(name, value) if v2 else None
+            
+            # Создаём гибридную переменную поверх той же V2 переменной,
+            # чтобы формулы V2 решения и кэш гибридной переменной видели одно значение
+            hybrid_var = HybridVariable(name, value, var_type, self.name, self.next_variable_id, aliases,
+                                        v2_variable)
+            variables[name] = hybrid_var
+            self.next_variable_id += 1
+            
+            by_id[hybrid_var.variable_id] = hybrid_var
+            if v2_variable is not None:
+                v2_to_hybrid[id(v2_variable)] = hybrid_var
             for alias in aliases:
-                try:
-                    self.v2_solution.set_alias(alias, name)
-                except ValueError as e:
-                    print(f"Warning: Could not set alias '{alias}' for '{name}': {e}")
+                # Как и при переборе: алиас принадлежит первой объявившей его переменной
+                by_alias.setdefault(alias, hybrid_var)
+            
+            # Устанавливаем алиасы ПОСЛЕ создания переменной
+            if v2:
+                for alias in aliases:
+                    try:
+                        v2_set_alias(alias, name)
+                    except ValueError as e:
+                        print(f"Warning: Could not set alias '{alias}' for '{name}': {e}")
+            
+            created.append(hybrid_var)
         
-        return hybrid_var
+        self._ref_cache.clear()
+        return created
     
     def get_variable_by_reference(self, reference: str) -> Optional[HybridVariable]:
-        """Получить переменную по любому типу ссылки"""
+        """Получить переменную по любому типу ссылки (найденные ссылки кэшируются)"""
+        var = self._ref_cache.get(reference)
+        if var is None:
+            var = self._resolve_reference(reference)
+            if var is not None:
+                self._ref_cache[reference] = var
+        return var
+    
+    def _resolve_reference(self, reference: str) -> Optional[HybridVariable]:
+        """Разрешить ссылку: имя, #number[.name], V2 алиас, Legacy алиас"""
         reference = reference.strip()
         
         # Прямое имя переменной
-        if reference in self.variables:
-            return self.variables[reference]
-        
-        # Legacy #number ссылка
-        if reference.startswith('#'):
-            try:
-                var_id = int(reference[1:])
-                for var in self.variables.values():
-                    if var.variable_id == var_id:
-                        return var
-            except ValueError:
-                pass
-        
-        # Legacy #number.name ссылка
-        if '.' in reference and reference.startswith('#'):
-            try:
-                parts = reference.split('.')
-                var_id = int(parts[0][1:])
-                for var in self.variables.values():
-                    if var.variable_id == var_id:
-                        return var
-            except (ValueError, IndexError):
-                pass
+        var = self.variables.get(reference)
+        if var is not None:
+            return var
+        
+        # Legacy #number и #number.name ссылки: один разбор регуляркой
+        if reference[:1] == '#':
+            match = _REF_RE.match(reference)
+            if match:
+                var = self._by_id.get(int(match.group(1)))
+                if var is not None:
+                    return var
         
         # V2 алиас
         if self.v2_solution:
             v2_var = self.v2_solution.get_variable(reference)
             if v2_var:
-                # Найти соответствующую гибридную переменную
-                for var in self.variables.values():
-                    if var.v2_variable is v2_var:
-                        return var
+                # Соответствующая гибридная переменная - по идентичности V2 переменной
+                var = self._v2_to_hybrid.get(id(v2_var))
+                if var is not None:
+                    return var
         
         # Поиск по алиасам в Legacy
-        for var in self.variables.values():
-            if reference in var.aliases:
-                return var
-        
-        return None
+        return self._by_alias.get(reference)
     
     def execute_v2_expression(self, expression: str):
         """Выполнить выражение V2"""
@@ -345,18 +660,9 @@ class HybridSolution:
         solution_registry = v2_solution_manager.get_all_solutions()
         self.v2_solution.execute_expression(expression, solution_registry)
         
-        # Обновляем зависимости
-        try:
-            parsed = ExpressionParser.parse_expression(expression)
-            if parsed['type'] in [ExpressionType.FORMULA]:
-                var_name = parsed['variable']
-                dependencies = parsed['dependencies']
-                
-                var = self.get_variable_by_reference(var_name)
-                if var:
-                    v2_dependency_tracker.add_dependency(var.new_read_id, dependencies)
-        except Exception as e:
-            print(f"Warning: Could not update dependencies for '{expression}': {e}")
+        # Выражение могло добавить V2 алиас - найденные ссылки пересчитаем.
+        # Зависимости и кэш изменённой переменной обновляет HybridVariable._on_v2_changed
+        self._ref_cache.clear()
     
     def get_all_variables(self) -> List[HybridVariable]:
         """Получить все переменные"""
@@ -367,26 +673,46 @@ class HybridSolution:
         self.containing_space = space
         space.add_solution(self)
     
-    def debug_variables(self):
-        """Отладочная информация о переменных"""
-        print(f"\n=== Solution '{self.name}' Variables Debug ===")
+    @staticmethod
+    def _link_parents(result: 'HybridSolution', parents: List['HybridSolution']):
+        """Связать результат с родительскими решениями (в обе стороны)"""
+        result.parent_solutions = parents
+        for parent in parents:
+            parent.child_solutions.append(result)
+    
+    def debug_variables(self, force: bool = False):
+        """Отладочная информация о переменных одним вызовом (при DEBUG_VARIABLES или force)"""
+        if not (DEBUG_VARIABLES or force):
+            return
+        
+        lines = [f"\n=== Solution '{self.name}' Variables Debug ==="]
         for var in self.variables.values():
-            print(f"  {var}")
-            print(f"    Legacy: {var.legacy_full_id}")
-            print(f"    V2 Write: {var.new_write_id}")
-            print(f"    V2 Read: {var.new_read_id}")
+            lines.append(f"  {var}")
+            lines.append(f"    Legacy: {var.legacy_full_id}")
+            lines.append(f"    V2 Write: {var.new_write_id}")
+            lines.append(f"    V2 Read: {var.new_read_id}")
             if var.aliases:
-                print(f"    Aliases: {var.aliases}")
+                lines.append(f"    Aliases: {var.aliases}")
             if var.v2_variable and var.v2_variable.is_formula:
-                print(f"    Formula: {var.v2_variable.formula}")
+                lines.append(f"    Formula: {var.v2_variable.formula}")
+        sys.stdout.write('\n'.join(lines) + '\n')
 
 # =============================================================================
 # Специализированные решения
 # =============================================================================
 
+# Десятичное число вида -12.5: один необязательный минус, только ASCII цифры
+_NUMBER_LITERAL_RE = re.compile(r'-?[0-9]+(?:\.[0-9]+)?')
+
+def _is_number_literal(text: str) -> bool:
+    """Строка - десятичное число вида -12.5 (проверка без парсера выражений)"""
+    return _NUMBER_LITERAL_RE.fullmatch(text.strip()) is not None
+
 class HybridBoxSolution(HybridSolution):
     """Коробка с поддержкой V2 синтаксиса"""
     
+    __slots__ = ('_length_var', '_width_var', '_height_var', '_volume_var')
+    
     def __init__(self, name: str, length: Union[float, str], width: Union[float, str], height: Union[float, str]):
         super().__init__(name)
         self._setup_variables(length, width, height)
@@ -394,28 +720,39 @@ class HybridBoxSolution(HybridSolution):
     
     def _setup_variables(self, length, width, height):
         """Настроить переменные коробки"""
-        # Создаём переменные
-        length_var = self.create_variable("length", 0, VariableType.CONTROLLABLE, ["L", "len"])
-        width_var = self.create_variable("width", 0, VariableType.CONTROLLABLE, ["W", "wid"])
-        height_var = self.create_variable("height", 0, VariableType.CONTROLLABLE, ["H", "hei"])
+        # Создаём переменные, включая вычисляемый объём
+        length_var, width_var, height_var, volume_var = self.create_variables([
+            ("length", 0, VariableType.CONTROLLABLE, ["L", "len"]),
+            ("width", 0, VariableType.CONTROLLABLE, ["W", "wid"]),
+            ("height", 0, VariableType.CONTROLLABLE, ["H", "hei"]),
+            ("volume", 0, VariableType.CALCULATED, ["vol"]),
+        ])
+        
+        # Переменные размеров не пересоздаются - свойства читают их напрямую
+        self._length_var = length_var
+        self._width_var = width_var
+        self._height_var = height_var
+        self._volume_var = volume_var
         
         # Устанавливаем значения или формулы
         self._set_dimension_value(length_var, length, "length")
         self._set_dimension_value(width_var, width, "width")
         self._set_dimension_value(height_var, height, "height")
         
-        # Создаём вычисляемые переменные
-        self.create_variable("volume", 0, VariableType.CALCULATED, ["vol"])
         if self.v2_solution:
-            self.execute_v2_expression("volume@{0}=length.{0} * width.{0} * height.{0}".format(self.name))
+            name = self.name
+            self.execute_v2_expression(f"volume@{name}=length.{name} * width.{name} * height.{name}")
     
     def _set_dimension_value(self, var: HybridVariable, value: Union[float, str], dimension_name: str):
         """Установить значение размера (число или формула V2)"""
         if isinstance(value, (int, float)):
             var.value = float(value)
         elif isinstance(value, str):
-            # Это формула V2
-            if self.v2_solution:
+            if self.v2_solution and _is_number_literal(value):
+                # Число строкой: присваиваем напрямую, без парсера выражений V2
+                var.value = ExpressionParser._parse_value(value)
+            elif self.v2_solution:
+                # Это формула V2
                 expression = f"{dimension_name}@{self.name}={value}"
                 self.execute_v2_expression(expression)
             else:
@@ -438,42 +775,63 @@ class HybridBoxSolution(HybridSolution):
     @property
     def length(self) -> float:
         """Длина коробки"""
-        var = self.get_variable_by_reference("length")
-        return var.get_computed_value() if var else 0.0
+        return self._length_var.get_computed_value()
     
     @property
     def width(self) -> float:
         """Ширина коробки"""
-        var = self.get_variable_by_reference("width")
-        return var.get_computed_value() if var else 0.0
+        return self._width_var.get_computed_value()
     
     @property
     def height(self) -> float:
         """Высота коробки"""
-        var = self.get_variable_by_reference("height")
-        return var.get_computed_value() if var else 0.0
+        return self._height_var.get_computed_value()
     
     @property
     def volume(self) -> float:
         """Объём коробки"""
-        var = self.get_variable_by_reference("volume")
-        return var.get_computed_value() if var else 0.0
+        return self._volume_var.get_computed_value()
+    
+    def _has_formula_dims(self) -> bool:
+        """Задан ли хотя бы один из размеров формулой V2"""
+        for var in (self._length_var, self._width_var, self._height_var):
+            if var.v2_variable and var.v2_variable.is_formula:
+                return True
+        return False
+
+# Пары кромок, уменьшающие длину и ширину панели
+_FB: FrozenSet[str] = frozenset(('front', 'back'))
+_LR: FrozenSet[str] = frozenset(('left', 'right'))
+
+def _panel_dims_after_edging(length: float, width: float, height: float, thickness: float,
+                             has_front_back: bool, has_left_right: bool) -> Tuple[float, float, float]:
+    """Размеры панели после кромкования: каждая пара кромок уменьшает размер на 2 толщины"""
+    if has_front_back:
+        length -= 2 * thickness
+    if has_left_right:
+        width -= 2 * thickness
+    return length, width, height
 
 class HybridEdgeBandingSolution(HybridSolution):
     """Кромкование с поддержкой V2 синтаксиса"""
     
+    __slots__ = ('_edges_set',)
+    
     def __init__(self, name: str, material: str, thickness: float, edges: List[str]):
         super().__init__(name)
         self._setup_variables(material, thickness, edges)
     
     def _setup_variables(self, material, thickness, edges):
         """Настроить переменные кромкования"""
-        self.create_variable("material", material, VariableType.CONTROLLABLE, ["mat"])
-        self.create_variable("thickness", thickness, VariableType.CONTROLLABLE, ["thick", "t"])
-        self.create_variable("edges_count", len(edges), VariableType.CALCULATED, ["count"])
+        self.create_variables([
+            ("material", material, VariableType.CONTROLLABLE, ["mat"]),
+            ("thickness", thickness, VariableType.CONTROLLABLE, ["thick", "t"]),
+            ("edges_count", len(edges), VariableType.CALCULATED, ["count"]),
+        ])
         
         # Сохраняем список кромок как атрибут
         self.attributes['edges'] = edges
+        self._edges_set: FrozenSet[str] = frozenset(edges)
     
     def apply_to(self, panel: HybridBoxSolution) -> HybridBoxSolution:
         """Применить кромкование к панели"""
@@ -481,15 +839,17 @@ class HybridEdgeBandingSolution(HybridSolution):
         result_name = f"{panel.name}_edged"
         
         # Вычисляем новые размеры с учётом кромки
-        edges = self.attributes.get('edges', [])
+        edges_set = self._edges_set
         thickness = self.get_variable_by_reference("thickness").value
         
-        length_reduction = 2 * thickness if 'front' in edges or 'back' in edges else 0
-        width_reduction = 2 * thickness if 'left' in edges or 'right' in edges else 0
+        has_front_back = not edges_set.isdisjoint(_FB)
+        has_left_right = not edges_set.isdisjoint(_LR)
+        length_reduction = 2 * thickness if has_front_back else 0
+        width_reduction = 2 * thickness if has_left_right else 0
         
         # Создаём результирующую панель
-        if self.v2_solution:
-            # Используем V2 формулы
+        if self.v2_solution and panel._has_formula_dims():
+            # Размеры панели заданы формулами - связываем результат через V2 формулы
             result = HybridBoxSolution(
                 result_name,
                 f"length.{panel.name} - {length_reduction}",
@@ -497,18 +857,15 @@ class HybridEdgeBandingSolution(HybridSolution):
                 f"height.{panel.name}"
             )
         else:
-            # Fallback: числовые значения
+            # Размеры панели - числа (или V2 недоступна): считаем сразу, без разбора формул
             result = HybridBoxSolution(
                 result_name,
-                panel.length - length_reduction,
-                panel.width - width_reduction,
-                panel.height
+                *_panel_dims_after_edging(panel.length, panel.width, panel.height,
+                                          thickness, has_front_back, has_left_right)
             )
         
         # Устанавливаем связи
-        result.parent_solutions = [panel, self]
-        panel.child_solutions.append(result)
-        self.child_solutions.append(result)
+        HybridSolution._link_parents(result, [panel, self])
         
         return result
 
@@ -519,27 +876,41 @@ class HybridEdgeBandingSolution(HybridSolution):
 class Part3DSpace:
     """3D пространство для размещения решений"""
     
+    __slots__ = ('name', 'space_id', 'solutions', '_solution_set', '_by_type', 'coordinate_system')
+    
     def __init__(self, name: str):
         self.name = name
-        self.space_id = str(uuid.uuid4())
-        self.solutions: List[HybridSolution] = []
+        self.space_id = f"space-{next(_id_counter)}"
+        self.solutions: List[HybridSolution] = []  # В порядке добавления
+        self._solution_set: Set[HybridSolution] = set()  # Для проверки членства за O(1)
+        # Индекс по типам: класс (и все его базовые классы) -> решения в порядке добавления
+        self._by_type: Dict[type, List[HybridSolution]] = defaultdict(list)
         self.coordinate_system = "cartesian"  # или "cylindrical", "spherical"
         
     def add_solution(self, solution: HybridSolution):
         """Добавить решение в пространство"""
-        if solution not in self.solutions:
+        if solution not in self._solution_set:
+            self._solution_set.add(solution)
             self.solutions.append(solution)
+            for cls in type(solution).__mro__[:-1]:  # без object
+                self._by_type[cls].append(solution)
             solution.containing_space = self
     
     def remove_solution(self, solution: HybridSolution):
         """Удалить решение из пространства"""
-        if solution in self.solutions:
+        if solution in self._solution_set:
+            self._solution_set.discard(solution)
             self.solutions.remove(solution)
+            for cls in type(solution).__mro__[:-1]:
+                self._by_type[cls].remove(solution)
             solution.containing_space = None
     
     def get_solutions_by_type(self, solution_type: type) -> List[HybridSolution]:
         """Получить решения определённого типа"""
-        return [sol for sol in self.solutions if isinstance(sol, solution_type)]
+        if isinstance(solution_type, tuple):
+            # Кортеж типов, как в isinstance - индекс не применим
+            return [sol for sol in self.solutions if isinstance(sol, solution_type)]
+        return list(self._by_type.get(solution_type, ()))
 
 # =============================================================================
 # Демонстрационные функции
@@ -607,7 +978,7 @@ def demo_hybrid_system():
         print(f"Всего переменных в системе: {len(all_vars)}")
         
         for var_info in all_vars[:5]:  # Показываем первые 5
-            print(f"  {var_info['new_write_id']}: {var_info['computed_value']}")
+            print(f"  {var_info.new_write_id}: {var_info.computed_value}")
         
         print("\n✅ Демонстрация гибридной системы завершена!")
         
@@ -637,10 +1008,10 @@ def demo_expression_parsing():
         try:
             parsed = ExpressionParser.parse_expression(expr)
             print(f"✅ {expr}")
-            print(f"   Тип: {parsed['type'].value}")
+            print(f"   Тип: {parsed.type.value}")
             
-            if 'dependencies' in parsed:
-                print(f"   Зависимости: {parsed['dependencies']}")
+            if parsed.dependencies is not None:
+                print(f"   Зависимости: {set(parsed.dependencies)}")
             
         except Exception as e:
             print(f"❌ {expr}: {e}")
@@ -2,44 +2,97 @@
 # Каждый Solution имеет номер #x, переменные #x.1, #x.2, #x.length
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Set, Any, Callable, Optional, Union
 from enum import Enum
+import io
+import itertools
 import json
+import re
+import sys
 import uuid
+from collections.abc import MutableSequence
+
+# Быстрая сериализация .vsol (C-реализация JSON); без неё - стандартный json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Двоичный вариант .vsol (MessagePack, та же схема): pip install msgpack
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+# Пакетный пересчёт объёмов BoxSolution; без NumPy - обычный цикл
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Включает Solution.debug_variables() без явного force=True - например, чтобы
+# UI иерархии печатал переменные каждого созданного решения
+DEBUG_VARIABLES = False
 
 # =============================================================================
 # Глобальный менеджер номеров Solution
 # =============================================================================
 
+# Нумерация Solution на уровне модуля: выдача номера - один next() по счётчику
+_solution_counter = itertools.count(1)
+_solution_registry: Dict[int, 'Solution'] = {}  # {number: solution}
+
+def get_next_solution_number() -> int:
+    """Получить следующий уникальный номер для Solution"""
+    return next(_solution_counter)
+
+def peek_next_solution_number() -> int:
+    """Следующий номер без его выдачи"""
+    global _solution_counter
+    number = next(_solution_counter)
+    _solution_counter = itertools.count(number)
+    return number
+
+def reserve_solution_numbers(up_to: int):
+    """Не выдавать номера до up_to включительно (после загрузки из файла)"""
+    global _solution_counter
+    _solution_counter = itertools.count(max(peek_next_solution_number(), up_to + 1))
+
+def register_solution(number: int, solution: 'Solution'):
+    """Зарегистрировать Solution под номером"""
+    _solution_registry[number] = solution
+
 class SolutionNumberManager:
-    """Глобальный менеджер для выдачи уникальных номеров Solution"""
-    _instance = None
-    _next_number = 1
-    _solution_registry = {}  # {number: solution}
+    """Фасад над нумерацией Solution уровня модуля (для UI и совместимости)"""
     
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
+    @property
+    def _next_number(self) -> int:
+        return peek_next_solution_number()
+    
+    @property
+    def _solution_registry(self) -> Dict[int, 'Solution']:
+        return _solution_registry
     
     def get_next_number(self) -> int:
         """Получить следующий уникальный номер для Solution"""
-        number = self._next_number
-        self._next_number += 1
-        return number
+        return next(_solution_counter)
     
     def register_solution(self, number: int, solution: 'Solution'):
         """Зарегистрировать Solution под номером"""
-        self._solution_registry[number] = solution
+        _solution_registry[number] = solution
     
     def get_solution_by_number(self, number: int) -> Optional['Solution']:
         """Получить Solution по номеру"""
-        return self._solution_registry.get(number)
+        return _solution_registry.get(number)
     
     def reset(self):
         """Сброс для тестирования"""
-        self._next_number = 1
-        self._solution_registry.clear()
+        global _solution_counter
+        _solution_counter = itertools.count(1)
+        _solution_registry.clear()
 
 # Глобальный экземпляр менеджера
 solution_number_manager = SolutionNumberManager()
@@ -56,45 +109,79 @@ class VariableType(Enum):
 class HierarchicalVariable:
     """Переменная с иерархической адресацией #solution_number.variable_number"""
     
+    __slots__ = ('solution_number', 'variable_number', 'name', 'value', 'variable_type', 'aliases', '_alias_set',
+                 '_full_id', '_named_id', '_vsol_fragments')
+    
     def __init__(self, name: str, value: Any, var_type: VariableType, solution_number: int):
         self.solution_number: int = solution_number
         self.variable_number: int = 0  # Будет установлен менеджером
         self.name: str = name
         self.value: Any = value
         self.variable_type: VariableType = var_type
-        self.aliases: List[str] = []
+        self.aliases: List[str] = []  # В порядке добавления
+        self._alias_set: Set[str] = set()  # Для проверки членства за O(1)
+        # ID строятся при первом обращении (номер переменной назначает менеджер)
+        self._full_id: Optional[str] = None
+        self._named_id: Optional[str] = None
+        self._vsol_fragments: Optional[tuple] = None  # Закодированные неизменяемые части (VsolFormat)
     
     @property
     def full_id(self) -> str:
         """Полный ID переменной: #1.2"""
-        return f"#{self.solution_number}.{self.variable_number}"
+        full_id = self._full_id
+        if full_id is None:
+            full_id = self._full_id = f"#{self.solution_number}.{self.variable_number}"
+        return full_id
     
     @property
     def named_id(self) -> str:
         """Именованный ID: #1.length"""
-        return f"#{self.solution_number}.{self.name}"
+        named_id = self._named_id
+        if named_id is None:
+            named_id = self._named_id = f"#{self.solution_number}.{self.name}"
+        return named_id
+    
+    def reset_ids(self):
+        """Сбросить кэш ID после изменения solution_number, variable_number или name"""
+        self._full_id = None
+        self._named_id = None
     
     def add_alias(self, alias: str):
-        if alias not in self.aliases:
+        if alias not in self._alias_set:
+            self._alias_set.add(alias)
             self.aliases.append(alias)
     
+    def has_alias(self, alias: str) -> bool:
+        return alias in self._alias_set
+    
     def __str__(self):
         return f"{self.full_id} ({self.named_id}) = {self.value}"
 
+# Ссылка #number[.rest]: номер и (необязательно) имя, номер или алиас переменной
+_REF_RE = re.compile(r'^#(\d+)(?:\.(.+))?$')
+
 class HierarchicalVariableManager:
     """Менеджер переменных с иерархической адресацией"""
     
+    # Создаётся на каждое решение - без __dict__
+    __slots__ = ('solution_number', '_variables', '_name_map', '_alias_map',
+                 '_ref_cache', '_info_cache', '_next_var_number')
+    
     def __init__(self, solution_number: int):
         self.solution_number: int = solution_number
         self._variables: Dict[int, HierarchicalVariable] = {}  # {var_number: variable}
         self._name_map: Dict[str, int] = {}  # {name: var_number}
         self._alias_map: Dict[str, int] = {}  # {alias: var_number}
+        self._ref_cache: Dict[str, HierarchicalVariable] = {}  # {reference: variable}
+        # Кэш name_mappings/alias_mappings для get_variable_info (меняются только в create_variable)
+        self._info_cache: Optional[Dict[str, Dict[str, str]]] = None
         self._next_var_number: int = 1
     
     def create_variable(self, name: str, value: Any, var_type: VariableType, aliases: List[str] = None) -> HierarchicalVariable:
         """Создать переменную с иерархической адресацией"""
         var = HierarchicalVariable(name, value, var_type, self.solution_number)
         var.variable_number = self._next_var_number
+        var.reset_ids()
         
         # Сохраняем переменную
         self._variables[self._next_var_number] = var
@@ -107,6 +194,8 @@ class HierarchicalVariableManager:
                 self._alias_map[alias] = self._next_var_number
         
         self._next_var_number += 1
+        self._ref_cache.clear()
+        self._info_cache = None
         return var
     
     def get_variable_by_reference(self, reference: str) -> Optional[HierarchicalVariable]:
@@ -116,38 +205,38 @@ class HierarchicalVariableManager:
         - "#1.length" - по именованному ID  
         - "length" - по локальному имени (в рамках этого Solution)
         - "L" - по локальному алиасу
-        """
         
-        # Полный ID: #1.2
-        if reference.startswith('#') and '.' in reference:
-            try:
-                parts = reference[1:].split('.')
-                solution_num = int(parts[0])
-                
-                # Проверяем, что это наш Solution
-                if solution_num != self.solution_number:
-                    return None
-                
-                # Второй элемент может быть числом или именем
-                second_part = parts[1]
-                
-                # Пробуем как число: #1.2
-                try:
-                    var_number = int(second_part)
-                    return self._variables.get(var_number)
-                except ValueError:
-                    # Пробуем как имя: #1.length
-                    var_number = self._name_map.get(second_part)
-                    if var_number:
-                        return self._variables.get(var_number)
-                    
-                    # Пробуем как алиас: #1.L
-                    var_number = self._alias_map.get(second_part)
-                    if var_number:
-                        return self._variables.get(var_number)
-                        
-            except (ValueError, IndexError):
+        Найденные ссылки кэшируются до создания следующей переменной.
+        """
+        var = self._ref_cache.get(reference)
+        if var is None:
+            var = self._resolve_reference(reference)
+            if var is not None:
+                self._ref_cache[reference] = var
+        return var
+    
+    def _resolve_reference(self, reference: str) -> Optional[HierarchicalVariable]:
+        """Разрешить ссылку без кэша"""
+        # Ссылки #...: один разбор регуляркой, остальные ветки пропускаются
+        if reference[:1] == '#':
+            match = _REF_RE.match(reference)
+            if match is None or match.group(2) is None:
+                return None
+            
+            # Проверяем, что это наш Solution
+            if int(match.group(1)) != self.solution_number:
                 return None
+            
+            # Второй элемент может быть числом или именем
+            second_part = match.group(2)
+            
+            # Пробуем как число: #1.2
+            if second_part.isdigit():
+                return self._variables.get(int(second_part))
+            
+            # Пробуем как имя: #1.length, затем как алиас: #1.L
+            var_number = self._name_map.get(second_part) or self._alias_map.get(second_part)
+            return self._variables.get(var_number) if var_number else None
         
         # Локальное имя: "length"
         var_number = self._name_map.get(reference)
@@ -166,16 +255,15 @@ class HierarchicalVariableManager:
         return list(self._variables.values())
     
     def get_variable_info(self) -> Dict[str, Any]:
-        """Получить информацию о всех переменных для отладки"""
-        info = {
-            "solution_number": self.solution_number,
-            "variables": {},
-            "name_mappings": {},
-            "alias_mappings": {}
-        }
+        """
+        Получить информацию о всех переменных для отладки
         
+        Значения переменных собираются заново при каждом вызове, а способы
+        обращения (name_mappings/alias_mappings) строятся один раз и кэшируются.
+        """
+        variables = {}
         for var in self._variables.values():
-            info["variables"][var.full_id] = {
+            variables[var.full_id] = {
                 "name": var.name,
                 "named_id": var.named_id,
                 "value": var.value,
@@ -183,42 +271,67 @@ class HierarchicalVariableManager:
                 "aliases": var.aliases
             }
         
-        # Показать все возможные способы обращения
+        if self._info_cache is None:
+            self._info_cache = self._build_mappings()
+        
+        return {
+            "solution_number": self.solution_number,
+            "variables": variables,
+            "name_mappings": dict(self._info_cache["name_mappings"]),
+            "alias_mappings": dict(self._info_cache["alias_mappings"])
+        }
+    
+    def _build_mappings(self) -> Dict[str, Dict[str, str]]:
+        """Все способы обращения к переменным: по имени, ID и алиасам"""
+        name_mappings: Dict[str, str] = {}
+        alias_mappings: Dict[str, str] = {}
+        sn_prefix = f"#{self.solution_number}."
+        
         for var in self._variables.values():
+            full_id = var.full_id
+            
             # По имени
-            info["name_mappings"][var.name] = var.full_id
-            info["name_mappings"][var.named_id] = var.full_id
-            info["name_mappings"][var.full_id] = var.full_id
+            name_mappings[var.name] = full_id
+            name_mappings[var.named_id] = full_id
+            name_mappings[full_id] = full_id
             
             # По алиасам
             for alias in var.aliases:
-                info["alias_mappings"][alias] = var.full_id
-                info["alias_mappings"][f"#{self.solution_number}.{alias}"] = var.full_id
+                alias_mappings[alias] = full_id
+                alias_mappings[sn_prefix + alias] = full_id
         
-        return info
+        return {"name_mappings": name_mappings, "alias_mappings": alias_mappings}
 
 # =============================================================================
 # Пространственная система (без изменений)
 # =============================================================================
 
 class CoordinateSystem:
+    __slots__ = ('origin', 'rotation')
+    
     def __init__(self, origin=(0, 0, 0), rotation=(0, 0, 0)):
         self.origin = origin
         self.rotation = rotation
 
 class Space(ABC):
+    __slots__ = ('name', 'coordinate_system', 'child_spaces', 'solutions', '_solution_set')
+    
     def __init__(self, name: str):
         self.name: str = name
         self.coordinate_system: CoordinateSystem = CoordinateSystem()
         self.child_spaces: List[Space] = []
-        self.solutions: List['Solution'] = []
+        self.solutions: List['Solution'] = []  # В порядке добавления
+        self._solution_set: Set['Solution'] = set()  # Для проверки членства за O(1)
     
     def add_solution(self, solution: 'Solution'):
-        if solution not in self.solutions:
+        if solution not in self._solution_set:
+            self._solution_set.add(solution)
             self.solutions.append(solution)
             solution.containing_space = self
 
 class Part3DSpace(Space):
+    __slots__ = ()
+    
     def __init__(self, name: str):
         super().__init__(name)
 
@@ -232,13 +345,19 @@ class IntegrationType(Enum):
     MODIFICATION = "modification"
 
 class Solution(ABC):
-    def __init__(self, name: str):
-        self.solution_id: str = str(uuid.uuid4())
+    __slots__ = ('_solution_id', 'name', 'solution_number', 'variables',
+                 'containing_space', 'parent_solutions', 'child_solutions', 'coordinate_system')
+    
+    def __init__(self, name: str, *, solution_number: Optional[int] = None):
+        self._solution_id: Optional[str] = None  # UUID создаётся при первом обращении
         self.name: str = name
         
-        # Получаем уникальный номер Solution
-        self.solution_number: int = solution_number_manager.get_next_number()
-        solution_number_manager.register_solution(self.solution_number, self)
+        # Получаем уникальный номер Solution; при загрузке из файла номер уже
+        # зарезервирован (reserve_solution_numbers) и передаётся явно
+        if solution_number is None:
+            solution_number = next(_solution_counter)
+        self.solution_number: int = solution_number
+        _solution_registry[solution_number] = self
         
         # Создаем менеджер переменных с нашим номером
         self.variables: HierarchicalVariableManager = HierarchicalVariableManager(self.solution_number)
@@ -248,6 +367,18 @@ class Solution(ABC):
         self.child_solutions: List[Solution] = []
         self.coordinate_system: CoordinateSystem = CoordinateSystem()
     
+    @property
+    def solution_id(self) -> str:
+        """
+        Глобально уникальный ID (сохраняется в .vsol)
+        
+        UUID создаётся лениво: решения, которые не сохраняются и не
+        отображаются, не платят за генерацию.
+        """
+        if self._solution_id is None:
+            self._solution_id = str(uuid.uuid4())
+        return self._solution_id
+    
     def place_in_space(self, space: Space):
         space.add_solution(self)
     
@@ -265,25 +396,29 @@ class Solution(ABC):
         """Получить полную ссылку на Solution: #3"""
         return f"#{self.solution_number}"
     
-    def debug_variables(self):
-        """Отладочная информация о переменных"""
-        print(f"\nSolution #{self.solution_number}: {self.name}")
-        print("=" * 50)
+    def debug_variables(self, out=None, force: bool = False):
+        """Отладочная информация о переменных в out (по умолчанию stdout), если DEBUG_VARIABLES или force"""
+        if not (DEBUG_VARIABLES or force):
+            return
+        
+        lines = [f"\nSolution #{self.solution_number}: {self.name}", "=" * 50]
         
         for var in self.variables.get_all_variables():
-            print(f"{var.full_id} | {var.named_id} | {var.name} = {var.value}")
-            if var.aliases:
-                for alias in var.aliases:
-                    print(f"    └─ #{self.solution_number}.{alias} = {var.value}")
+            lines.append(f"{var.full_id} | {var.named_id} | {var.name} = {var.value}")
+            for alias in var.aliases:
+                lines.append(f"    └─ #{self.solution_number}.{alias} = {var.value}")
         
-        print("\nВсе способы обращения:")
+        lines.append("\nВсе способы обращения:")
         info = self.variables.get_variable_info()
         for name, full_id in info["name_mappings"].items():
-            print(f"  {name} → {full_id}")
+            lines.append(f"  {name} → {full_id}")
+        (out or sys.stdout).write('\n'.join(lines) + '\n')
 
 class PrimitiveSolution(Solution):
-    def __init__(self, name: str):
-        super().__init__(name)
+    __slots__ = ()
+    
+    def __init__(self, name: str, *, solution_number: Optional[int] = None):
+        super().__init__(name, solution_number=solution_number)
     
     def integrate_with(self, other: Solution, integration_type: IntegrationType) -> Solution:
         result = CompositeSolution(f"{self.name} + {other.name}")
@@ -291,8 +426,10 @@ class PrimitiveSolution(Solution):
         return result
 
 class ModificationSolution(Solution):
-    def __init__(self, name: str):
-        super().__init__(name)
+    __slots__ = ()
+    
+    def __init__(self, name: str, *, solution_number: Optional[int] = None):
+        super().__init__(name, solution_number=solution_number)
     
     def integrate_with(self, other: Solution, integration_type: IntegrationType) -> Solution:
         result = CompositeSolution(f"{other.name} + {self.name}")
@@ -300,8 +437,10 @@ class ModificationSolution(Solution):
         return result
 
 class CompositeSolution(Solution):
-    def __init__(self, name: str):
-        super().__init__(name)
+    __slots__ = ()
+    
+    def __init__(self, name: str, *, solution_number: Optional[int] = None):
+        super().__init__(name, solution_number=solution_number)
     
     def integrate_with(self, other: Solution, integration_type: IntegrationType) -> Solution:
         result = CompositeSolution(f"{self.name} + {other.name}")
@@ -313,49 +452,80 @@ class CompositeSolution(Solution):
 # =============================================================================
 
 class BoxSolution(PrimitiveSolution):
-    def __init__(self, name: str, length: float, width: float, height: float):
-        super().__init__(name)
+    # Прямые ссылки на переменные размеров - без поиска по имени на каждом чтении
+    __slots__ = ('_length_var', '_width_var', '_height_var', '_volume_var')
+    
+    def __init__(self, name: str, length: float, width: float, height: float, *,
+                 solution_number: Optional[int] = None):
+        super().__init__(name, solution_number=solution_number)
         self._setup_variables(length, width, height)
     
     def _setup_variables(self, length: float, width: float, height: float):
         # Создаем переменные с иерархической адресацией
-        self.variables.create_variable("length", length, VariableType.CONTROLLABLE, ["L", "len"])
-        self.variables.create_variable("width", width, VariableType.CONTROLLABLE, ["W", "wid"])  
-        self.variables.create_variable("height", height, VariableType.CONTROLLABLE, ["H", "hei"])
+        self._length_var = self.variables.create_variable("length", length, VariableType.CONTROLLABLE, ["L", "len"])
+        self._width_var = self.variables.create_variable("width", width, VariableType.CONTROLLABLE, ["W", "wid"])
+        self._height_var = self.variables.create_variable("height", height, VariableType.CONTROLLABLE, ["H", "hei"])
         
         # Вычисляемая переменная - объем
         volume = length * width * height
-        self.variables.create_variable("volume", volume, VariableType.DERIVED, ["vol"])
+        self._volume_var = self.variables.create_variable("volume", volume, VariableType.DERIVED, ["vol"])
     
     @property
     def length(self) -> float:
-        # Теперь обращаемся к переменной #solution_number.1
-        return self.variables.get_variable_by_reference("length").value
+        # Переменная #solution_number.1
+        return self._length_var.value
     
     @property  
     def width(self) -> float:
-        return self.variables.get_variable_by_reference("width").value
+        return self._width_var.value
     
     @property
     def height(self) -> float:
-        return self.variables.get_variable_by_reference("height").value
+        return self._height_var.value
     
     def update_dimensions(self, length: float = None, width: float = None, height: float = None):
-        """Обновление размеров с пересчетом объема"""
+        """Обновление размеров с пересчетом объема (None - размер не меняется)"""
         if length is not None:
-            self.variables.get_variable_by_reference("length").value = length
+            self._length_var.value = length
         if width is not None:
-            self.variables.get_variable_by_reference("width").value = width
+            self._width_var.value = width
         if height is not None:
-            self.variables.get_variable_by_reference("height").value = height
+            self._height_var.value = height
         
         # Пересчитываем объем
-        new_volume = self.length * self.width * self.height
-        self.variables.get_variable_by_reference("volume").value = new_volume
+        self._volume_var.value = self._length_var.value * self._width_var.value * self._height_var.value
+
+def recompute_box_volumes(boxes: List[BoxSolution]):
+    """
+    Пересчитать объёмы набора коробок одним проходом
+    
+    Для массовых изменений (каталог деталей, параметрические серии): размеры
+    задаются через переменные без пересчёта, затем объёмы считаются разом -
+    с NumPy одним векторным умножением по массиву N x 3.
+    """
+    if not boxes:
+        return
+    
+    if NUMPY_AVAILABLE:
+        dims = np.fromiter(
+            (value
+             for box in boxes
+             for value in (box._length_var.value, box._width_var.value, box._height_var.value)),
+            dtype=np.float64, count=3 * len(boxes)
+        ).reshape(-1, 3)
+        volumes = dims.prod(axis=1).tolist()
+        for box, volume in zip(boxes, volumes):
+            box._volume_var.value = volume
+    else:
+        for box in boxes:
+            box._volume_var.value = box._length_var.value * box._width_var.value * box._height_var.value
 
 class EdgeBandingSolution(ModificationSolution):
-    def __init__(self, name: str, material: str, thickness: float, edges: List[str]):
-        super().__init__(name)
+    __slots__ = ()
+    
+    def __init__(self, name: str, material: str, thickness: float, edges: List[str], *,
+                 solution_number: Optional[int] = None):
+        super().__init__(name, solution_number=solution_number)
         self._setup_variables(material, thickness, edges)
     
     def _setup_variables(self, material: str, thickness: float, edges: List[str]):
@@ -367,179 +537,435 @@ class EdgeBandingSolution(ModificationSolution):
 # Обновленный файловый формат
 # =============================================================================
 
+class LazyParentList(MutableSequence):
+    """
+    Список parent_solutions, загруженный из .vsol: решения создаются при первом обращении
+    
+    До первого обращения хранит сырые словари из файла. Элементы лежат во
+    внутреннем списке, поэтому любой доступ идёт через _materialize(): сначала
+    восстанавливаются все решения, дальше это обычная изменяемая последовательность.
+    """
+    __slots__ = ('_items', '_pending', '_loader')
+    
+    def __init__(self, pending: List[dict], loader: Callable[[dict], 'Solution']):
+        self._items: List[Solution] = []
+        self._pending: Optional[List[dict]] = pending
+        self._loader: Optional[Callable[[dict], Solution]] = loader
+    
+    @property
+    def is_loaded(self) -> bool:
+        return self._pending is None
+    
+    def _materialize(self) -> List['Solution']:
+        pending = self._pending
+        if pending is not None:
+            loader = self._loader
+            self._pending = None
+            self._loader = None
+            self._items.extend([loader(data) for data in pending])
+        return self._items
+    
+    def __getitem__(self, index):
+        return self._materialize()[index]
+    
+    def __setitem__(self, index, value):
+        self._materialize()[index] = value
+    
+    def __delitem__(self, index):
+        del self._materialize()[index]
+    
+    def __len__(self) -> int:
+        return len(self._materialize())
+    
+    def __iter__(self):
+        return iter(self._materialize())
+    
+    def __contains__(self, value) -> bool:
+        return value in self._materialize()
+    
+    def insert(self, index: int, value: 'Solution'):
+        self._materialize().insert(index, value)
+    
+    def __eq__(self, other) -> bool:
+        if isinstance(other, LazyParentList):
+            other = other._materialize()
+        return self._materialize() == other
+    
+    __hash__ = None
+    
+    def __add__(self, other) -> List['Solution']:
+        return self._materialize() + list(other)
+    
+    def __radd__(self, other) -> List['Solution']:
+        return list(other) + self._materialize()
+    
+    def __repr__(self) -> str:
+        return repr(self._materialize())
+
+# Буфер записи .vsol: решение пишется в файл по частям
+_VSOL_BUFFER_SIZE = 64 * 1024
+
+def _dumps(obj: Any) -> bytes:
+    """Закодировать одно значение в JSON (UTF-8 байты)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    # Компактные разделители - тот же вид, что у orjson
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
 class VsolFormat:
+    # {имя типа Solution: функция восстановления из словаря .vsol}; прочие типы - CompositeSolution
+    _DESERIALIZERS: Dict[str, Callable[[dict], Solution]] = {}
+    
+    @classmethod
+    def register(cls, type_name: str):
+        """Декоратор: зарегистрировать функцию восстановления для типа Solution"""
+        def decorator(factory: Callable[[dict], Solution]) -> Callable[[dict], Solution]:
+            cls._DESERIALIZERS[type_name] = factory
+            return factory
+        return decorator
+    
+    @staticmethod
+    def save_solution(solution: Solution, filepath: str, include_derived: bool = False):
+        """
+        Сохранить решение в .vsol
+        
+        Производные переменные (объём) не пишутся - конструктор восстанавливает их
+        из исходных; include_derived=True - полный дамп для отладки.
+        """
+        with open(filepath, 'wb', buffering=_VSOL_BUFFER_SIZE) as f:
+            VsolFormat._write_solution(solution, f.write, include_derived)
+            f.write(b'\n')
+    
     @staticmethod
-    def save_solution(solution: Solution, filepath: str):
-        data = VsolFormat._serialize_solution(solution)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+    def save_solution_binary(solution: Solution, filepath: str, include_derived: bool = False):
+        """Сохранить решение в двоичном формате (MessagePack, схема как у .vsol)"""
+        if not MSGPACK_AVAILABLE:
+            raise ImportError("Для двоичного формата .vsolb установите msgpack: pip install msgpack")
+        with open(filepath, 'wb') as f:
+            f.write(msgpack.packb(VsolFormat._solution_to_data(solution, include_derived), use_bin_type=True))
     
     @staticmethod
     def load_solution(filepath: str) -> Solution:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        """Загрузить решение; формат (JSON или MessagePack) определяется по первому байту"""
+        with open(filepath, 'rb') as f:
+            raw = f.read()
+        
+        # Формат определяется по началу файла - без копии всего содержимого
+        if raw[:64].lstrip()[:1] == b'{':
+            if ORJSON_AVAILABLE:
+                data = orjson.loads(raw)  # UTF-8 проверяет и декодирует сам orjson
+            else:
+                data = json.loads(raw)  # bytes: json сам определит UTF-8 и декодирует одним вызовом
+        else:
+            if not MSGPACK_AVAILABLE:
+                raise ImportError(f"Файл '{filepath}' в двоичном формате - установите msgpack: pip install msgpack")
+            data = msgpack.unpackb(raw, raw=False)
         return VsolFormat._deserialize_solution(data)
     
+    # Двоичный формат читается тем же load_solution
+    load_solution_binary = load_solution
+    
     @staticmethod
-    def _serialize_solution(solution: Solution) -> dict:
-        variables = {}
-        
-        for var in solution.variables.get_all_variables():
-            variables[var.full_id] = {
-                "name": var.name,
-                "named_id": var.named_id,
-                "value": var.value,
-                "type": var.variable_type.value,
-                "aliases": var.aliases
-            }
+    def _variable_data(var: HierarchicalVariable) -> dict:
+        return {
+            "name": var.name,
+            "named_id": var.named_id,
+            "value": var.value,
+            "type": var.variable_type.value,
+            "aliases": var.aliases
+        }
+    
+    @staticmethod
+    def _encode_variable(var: HierarchicalVariable) -> bytes:
+        """
+        Запись "full_id": {...} одной переменной (то же, что _dumps(_variable_data(var)))
         
+        ID, имя и тип кодируются один раз и хранятся в переменной, пока они
+        не изменились; при каждой записи кодируются только значение и алиасы.
+        """
+        key = (var.solution_number, var.variable_number, var.name, var.variable_type)
+        fragments = var._vsol_fragments
+        if fragments is None or fragments[0] != key:
+            head = (_dumps(var.full_id) + b': {"name":' + _dumps(var.name)
+                    + b',"named_id":' + _dumps(var.named_id) + b',"value":')
+            middle = b',"type":' + _dumps(var.variable_type.value) + b',"aliases":'
+            fragments = var._vsol_fragments = (key, head, middle)
+        return fragments[1] + _dumps(var.value) + fragments[2] + _dumps(var.aliases) + b'}'
+    
+    @staticmethod
+    def _coordinate_data(solution: Solution) -> dict:
         return {
-            "solution_id": solution.solution_id,
-            "solution_number": solution.solution_number,
-            "name": solution.name,
-            "type": type(solution).__name__,
-            "variables": variables,
-            "coordinate_system": {
-                "origin": solution.coordinate_system.origin,
-                "rotation": solution.coordinate_system.rotation
-            },
-            "parent_solutions": [VsolFormat._serialize_solution(parent) for parent in solution.parent_solutions]
+            "origin": solution.coordinate_system.origin,
+            "rotation": solution.coordinate_system.rotation
         }
     
     @staticmethod
-    def _deserialize_solution(data: dict) -> Solution:
-        solution_type = data["type"]
+    def _saved_variables(solution: Solution, include_derived: bool) -> List[HierarchicalVariable]:
+        """Переменные решения, которые пишутся в файл"""
+        variables = solution.variables.get_all_variables()
+        if include_derived:
+            return variables
+        return [var for var in variables if var.variable_type is not VariableType.DERIVED]
+    
+    @staticmethod
+    def _solution_to_data(solution: Solution, include_derived: bool = False) -> dict:
+        """
+        Словарь .vsol для решения - для кодеков без потоковой записи (MessagePack)
         
-        # Восстанавливаем номер Solution
-        solution_number_manager._next_number = max(solution_number_manager._next_number, data["solution_number"] + 1)
+        Обход и ссылки $ref - те же, что в _write_solution.
+        """
+        seen: Set[str] = set()
+        roots: List[dict] = []
+        stack = [(solution, roots)]  # (решение, список, куда добавить его словарь)
         
-        if solution_type == "BoxSolution":
-            # Извлекаем параметры из variables по именованным ID
-            vars_data = data["variables"]
-            length = None
-            width = None
-            height = None
-            
-            for var_id, var_info in vars_data.items():
-                if var_info["name"] == "length":
-                    length = var_info["value"]
-                elif var_info["name"] == "width":
-                    width = var_info["value"]
-                elif var_info["name"] == "height":
-                    height = var_info["value"]
-            
-            solution = BoxSolution(data["name"], length, width, height)
-            
-        elif solution_type == "EdgeBandingSolution":
-            vars_data = data["variables"]
-            material = None
-            thickness = None
-            edges = None
+        while stack:
+            node, out = stack.pop()
+            solution_id = node.solution_id
+            if solution_id in seen:
+                out.append({"$ref": solution_id})
+                continue
+            seen.add(solution_id)
             
-            for var_id, var_info in vars_data.items():
-                if var_info["name"] == "material":
-                    material = var_info["value"]
-                elif var_info["name"] == "thickness":
-                    thickness = var_info["value"]
-                elif var_info["name"] == "edges":
-                    edges = var_info["value"]
-            
-            solution = EdgeBandingSolution(data["name"], material, thickness, edges)
-        else:
-            solution = CompositeSolution(data["name"])
+            parents: List[dict] = []
+            out.append({
+                "solution_id": solution_id,
+                "solution_number": node.solution_number,
+                "name": node.name,
+                "type": type(node).__name__,
+                "variables": {var.full_id: VsolFormat._variable_data(var)
+                              for var in VsolFormat._saved_variables(node, include_derived)},
+                "coordinate_system": VsolFormat._coordinate_data(node),
+                "parent_solutions": parents
+            })
+            stack.extend((parent, parents) for parent in reversed(node.parent_solutions))
+        
+        return roots[0]
+    
+    @staticmethod
+    def _write_solution(solution: Solution, write, include_derived: bool = False):
+        """
+        Записать Solution потоком, без промежуточного дерева словарей
+        
+        Кодируются только листья (переменные, coordinate_system), родительские
+        решения записываются по мере обхода в глубину по явному стеку. Отступ -
+        2 пробела. Общий родитель (граф - DAG, а не дерево) записывается один
+        раз, повторы - ссылкой {"$ref": solution_id}.
+        """
+        seen: Set[str] = set()
+        stack = [VsolFormat._write_solution_node(solution, 0, write, seen, include_derived)]
+        
+        while stack:
+            # Узел отдаёт очередного родителя, когда подходит его место в файле
+            parent = next(stack[-1], None)
+            if parent is None:
+                stack.pop()
+            else:
+                stack.append(VsolFormat._write_solution_node(*parent, write, seen, include_derived))
+    
+    @staticmethod
+    def _write_solution_node(solution: Solution, depth: int, write, seen: Set[str], include_derived: bool):
+        """Записать одно решение; генератор отдаёт (родитель, глубина) для записи на месте"""
+        solution_id = solution.solution_id
+        if solution_id in seen:
+            write(b'{"$ref": ' + _dumps(solution_id) + b'}')
+            return
+        seen.add(solution_id)
+        
+        pad = b'\n' + b'  ' * (depth + 1)
+        inner = pad + b'  '
+        
+        # Всё до списка родителей собирается по частям и пишется одним вызовом
+        chunks = [b'{' + pad + b'"solution_id": ' + _dumps(solution_id)
+                  + b',' + pad + b'"solution_number": ' + _dumps(solution.solution_number)
+                  + b',' + pad + b'"name": ' + _dumps(solution.name)
+                  + b',' + pad + b'"type": ' + _dumps(type(solution).__name__)
+                  + b',' + pad + b'"variables": {']
+        
+        sep = inner
+        for var in VsolFormat._saved_variables(solution, include_derived):
+            chunks.append(sep + VsolFormat._encode_variable(var))
+            sep = b',' + inner
+        
+        chunks.append((pad if sep is not inner else b'') + b'},'
+                      + pad + b'"coordinate_system": ' + _dumps(VsolFormat._coordinate_data(solution))
+                      + b',' + pad + b'"parent_solutions": [')
+        write(b''.join(chunks))
         
-        # Восстанавливаем номер Solution
-        solution.solution_number = data["solution_number"]
-        solution_number_manager.register_solution(solution.solution_number, solution)
+        sep = inner
+        for parent in solution.parent_solutions:
+            write(sep)
+            yield parent, depth + 2
+            sep = b',' + inner
         
-        # Восстанавливаем родительские решения
-        for parent_data in data["parent_solutions"]:
-            parent = VsolFormat._deserialize_solution(parent_data)
-            solution.parent_solutions.append(parent)
+        write((pad if sep is not inner else b'') + b']' + pad[:-2] + b'}')
+    
+    @staticmethod
+    def _deserialize_solution(data: dict) -> Solution:
+        """
+        Восстановить Solution; родительские решения - лениво, при первом обращении
+        
+        Сразу создаётся только корневое решение: для списка файлов и предпросмотра
+        достаточно его размеров. Дерево словарей один раз обходится без создания
+        объектов - чтобы зарезервировать все номера из файла и найти цель любой
+        ссылки $ref, даже если решение с ней ещё не восстановлено.
+        """
+        index: Dict[str, dict] = {}  # {solution_id из файла: данные решения}
+        max_number = 0
+        stack = [data]
+        while stack:
+            node = stack.pop()
+            if "$ref" in node:
+                continue
+            index[node["solution_id"]] = node
+            max_number = max(max_number, node["solution_number"])
+            stack.extend(node["parent_solutions"])
+        
+        # Новые решения не получат номера, занятые ещё не восстановленными родителями
+        reserve_solution_numbers(max_number)
+        
+        built: Dict[str, Solution] = {}  # {solution_id из файла: восстановленное решение}
+        
+        def load(node: dict) -> Solution:
+            solution_id = node.get("$ref") or node["solution_id"]
+            solution = built.get(solution_id)
+            if solution is None:
+                node = index[solution_id]
+                # Номер Solution из файла передаётся в конструктор (все номера зарезервированы выше)
+                factory = VsolFormat._DESERIALIZERS.get(node["type"], _deserialize_composite)
+                solution = factory(node)
+                built[solution_id] = solution
+                
+                if node["parent_solutions"]:
+                    solution.parent_solutions = LazyParentList(node["parent_solutions"], load)
+            return solution
         
-        return solution
+        return load(data)
+
+def _saved_values(data: dict) -> Dict[str, Any]:
+    """
+    Значения сохранённых переменных по именам (индекс строится одним проходом)
+    
+    Имена интернируются: поиск по литералам "length", "width"... сводится к сравнению ссылок.
+    """
+    intern = sys.intern
+    return {intern(var_info["name"]): var_info["value"] for var_info in data["variables"].values()}
+
+@VsolFormat.register("BoxSolution")
+def _deserialize_box(data: dict) -> BoxSolution:
+    values = _saved_values(data)
+    length = values.get("length")
+    width = values.get("width")
+    height = values.get("height")
+    
+    return BoxSolution(data["name"], length, width, height, solution_number=data["solution_number"])
+
+@VsolFormat.register("EdgeBandingSolution")
+def _deserialize_edge_banding(data: dict) -> EdgeBandingSolution:
+    values = _saved_values(data)
+    material = values.get("material")
+    thickness = values.get("thickness")
+    edges = values.get("edges")
+    
+    return EdgeBandingSolution(data["name"], material, thickness, edges,
+                               solution_number=data["solution_number"])
+
+def _deserialize_composite(data: dict) -> CompositeSolution:
+    return CompositeSolution(data["name"], solution_number=data["solution_number"])
 
 # =============================================================================
 # Демонстрационные функции
 # =============================================================================
 
-def demo_hierarchical_variables():
-    """Демонстрация иерархической системы переменных"""
-    print("ДЕМОНСТРАЦИЯ ИЕРАРХИЧЕСКОЙ АДРЕСАЦИИ")
-    print("=" * 50)
+def demo_hierarchical_variables(out=None):
+    """
+    Демонстрация иерархической системы переменных
+    
+    Вывод накапливается в буфере и пишется в out (по умолчанию stdout) одним вызовом.
+    """
+    buf = io.StringIO()
+    
+    print("ДЕМОНСТРАЦИЯ ИЕРАРХИЧЕСКОЙ АДРЕСАЦИИ", file=buf)
+    print("=" * 50, file=buf)
     
     # Создаем несколько решений
     panel1 = BoxSolution("Боковая панель", 600, 400, 18)
     panel2 = BoxSolution("Верхняя панель", 800, 300, 18)
     edge_banding = EdgeBandingSolution("Кромка ПВХ", "белая", 2.0, ["верх", "низ"])
     
-    print(f"Создано 3 решения:")
-    print(f"  Solution {panel1.get_full_reference()}: {panel1.name}")
-    print(f"  Solution {panel2.get_full_reference()}: {panel2.name}")
-    print(f"  Solution {edge_banding.get_full_reference()}: {edge_banding.name}")
+    print(f"Создано 3 решения:", file=buf)
+    print(f"  Solution {panel1.get_full_reference()}: {panel1.name}", file=buf)
+    print(f"  Solution {panel2.get_full_reference()}: {panel2.name}", file=buf)
+    print(f"  Solution {edge_banding.get_full_reference()}: {edge_banding.name}", file=buf)
     
     # Показываем детальную информацию о переменных
-    panel1.debug_variables()
+    panel1.debug_variables(buf, force=True)
     
-    print(f"\nПРИМЕРЫ ОБРАЩЕНИЯ К ПЕРЕМЕННЫМ:")
-    print("-" * 30)
+    print(f"\nПРИМЕРЫ ОБРАЩЕНИЯ К ПЕРЕМЕННЫМ:", file=buf)
+    print("-" * 30, file=buf)
     
     # Различные способы обращения к length панели #1
     length_var = panel1.variables.get_variable_by_reference("length")
-    print(f"Локально 'length': {length_var.value}")
+    print(f"Локально 'length': {length_var.value}", file=buf)
     
     length_var = panel1.variables.get_variable_by_reference("L")
-    print(f"Локально 'L': {length_var.value}")
+    print(f"Локально 'L': {length_var.value}", file=buf)
     
     length_var = panel1.variables.get_variable_by_reference("#1.length")
-    print(f"Полный '#1.length': {length_var.value}")
+    print(f"Полный '#1.length': {length_var.value}", file=buf)
     
     length_var = panel1.variables.get_variable_by_reference("#1.1")
-    print(f"Числовой '#1.1': {length_var.value}")
+    print(f"Числовой '#1.1': {length_var.value}", file=buf)
     
     length_var = panel1.variables.get_variable_by_reference("#1.L")
-    print(f"Алиас '#1.L': {length_var.value}")
+    print(f"Алиас '#1.L': {length_var.value}", file=buf)
     
     # Показываем разницу между решениями
-    print(f"\nСРАВНЕНИЕ РЕШЕНИЙ:")
-    print("-" * 20)
-    print(f"#{panel1.solution_number}.length = {panel1.length}")
-    print(f"#{panel2.solution_number}.length = {panel2.length}")
+    print(f"\nСРАВНЕНИЕ РЕШЕНИЙ:", file=buf)
+    print("-" * 20, file=buf)
+    print(f"#{panel1.solution_number}.length = {panel1.length}", file=buf)
+    print(f"#{panel2.solution_number}.length = {panel2.length}", file=buf)
     
     # Глобальный доступ
-    print(f"\nГЛОБАЛЬНЫЙ ДОСТУП:")
-    print("-" * 20)
+    print(f"\nГЛОБАЛЬНЫЙ ДОСТУП:", file=buf)
+    print("-" * 20, file=buf)
     solution_by_number = solution_number_manager.get_solution_by_number(1)
     if solution_by_number:
-        print(f"Solution #{1}: {solution_by_number.name}")
+        print(f"Solution #{1}: {solution_by_number.name}", file=buf)
     
+    (out or sys.stdout).write(buf.getvalue())
     return panel1, panel2, edge_banding
 
-def demo_variable_update():
-    """Демонстрация обновления переменных"""
-    print("\nДЕМОНСТРАЦИЯ ОБНОВЛЕНИЯ ПЕРЕМЕННЫХ")
-    print("=" * 35)
+def demo_variable_update(out=None):
+    """Демонстрация обновления переменных (вывод - одним вызовом в out)"""
+    buf = io.StringIO()
+    
+    print("\nДЕМОНСТРАЦИЯ ОБНОВЛЕНИЯ ПЕРЕМЕННЫХ", file=buf)
+    print("=" * 35, file=buf)
     
     panel = BoxSolution("Тестовая панель", 600, 400, 18)
     
-    print(f"Исходные размеры: {panel.length} x {panel.width} x {panel.height}")
-    print(f"Исходный объем: {panel.variables.get_variable_by_reference('volume').value}")
+    print(f"Исходные размеры: {panel.length} x {panel.width} x {panel.height}", file=buf)
+    print(f"Исходный объем: {panel.variables.get_variable_by_reference('volume').value}", file=buf)
     
     # Обновляем размеры
     panel.update_dimensions(length=800, width=500)
     
-    print(f"Новые размеры: {panel.length} x {panel.width} x {panel.height}")
-    print(f"Новый объем: {panel.variables.get_variable_by_reference('volume').value}")
+    print(f"Новые размеры: {panel.length} x {panel.width} x {panel.height}", file=buf)
+    print(f"Новый объем: {panel.variables.get_variable_by_reference('volume').value}", file=buf)
     
     # Показываем все обновленные переменные
-    print(f"\nВСЕ ПЕРЕМЕННЫЕ ПОСЛЕ ОБНОВЛЕНИЯ:")
+    print(f"\nВСЕ ПЕРЕМЕННЫЕ ПОСЛЕ ОБНОВЛЕНИЯ:", file=buf)
     for var in panel.variables.get_all_variables():
-        print(f"  {var}")
+        print(f"  {var}", file=buf)
+    
+    (out or sys.stdout).write(buf.getvalue())
 
-def demo_file_format():
-    """Демонстрация файлового формата с иерархической адресацией"""
-    print("\nДЕМОНСТРАЦИЯ ФАЙЛОВОГО ФОРМАТА")
-    print("=" * 30)
+def demo_file_format(out=None):
+    """Демонстрация файлового формата с иерархической адресацией (вывод - одним вызовом в out)"""
+    buf = io.StringIO()
+    
+    print("\nДЕМОНСТРАЦИЯ ФАЙЛОВОГО ФОРМАТА", file=buf)
+    print("=" * 30, file=buf)
     
     # Создаем и сохраняем решение
     panel = BoxSolution("Тестовая панель", 600, 400, 18)
@@ -548,17 +974,18 @@ def demo_file_format():
     
     # Сохраняем
     VsolFormat.save_solution(composite, "hierarchical_test.vsol")
-    print("✅ Решение сохранено в hierarchical_test.vsol")
+    print("✅ Решение сохранено в hierarchical_test.vsol", file=buf)
     
     # Загружаем
     loaded = VsolFormat.load_solution("hierarchical_test.vsol")
-    print(f"✅ Решение загружено: {loaded.name}")
-    print(f"   Solution #{loaded.solution_number}")
-    print(f"   Родительских решений: {len(loaded.parent_solutions)}")
+    print(f"✅ Решение загружено: {loaded.name}", file=buf)
+    print(f"   Solution #{loaded.solution_number}", file=buf)
+    print(f"   Родительских решений: {len(loaded.parent_solutions)}", file=buf)
+    
+    (out or sys.stdout).write(buf.getvalue())
 
 if __name__ == "__main__":
-    print("Visual Solving MVP - Иерархическая адресация")
-    print("=" * 55)
+    sys.stdout.write("Visual Solving MVP - Иерархическая адресация\n" + "=" * 55 + "\n")
     
     # Сброс для чистой демонстрации
     solution_number_manager.reset()
@@ -568,11 +995,13 @@ if __name__ == "__main__":
     demo_variable_update()
     demo_file_format()
     
-    print("\n🎯 КЛЮЧЕВЫЕ ОСОБЕННОСТИ:")
-    print("=" * 25)
-    print("✅ Каждый Solution имеет уникальный номер: #1, #2, #3...")
-    print("✅ Переменные адресуются иерархически: #1.1, #1.2, #1.3...")
-    print("✅ Именованные ссылки: #1.length, #1.width, #1.height")
-    print("✅ Алиасы работают: #1.L, #1.W, #1.H")
-    print("✅ Локальный доступ: 'length', 'L' (в рамках Solution)")
-    print("✅ Глобальная уникальность и отсутствие конфликтов")
+    sys.stdout.write("\n".join([
+        "\n🎯 КЛЮЧЕВЫЕ ОСОБЕННОСТИ:",
+        "=" * 25,
+        "✅ Каждый Solution имеет уникальный номер: #1, #2, #3...",
+        "✅ Переменные адресуются иерархически: #1.1, #1.2, #1.3...",
+        "✅ Именованные ссылки: #1.length, #1.width, #1.height",
+        "✅ Алиасы работают: #1.L, #1.W, #1.H",
+        "✅ Локальный доступ: 'length', 'L' (в рамках Solution)",
+        "✅ Глобальная уникальность и отсутствие конфликтов",
+    ]) + "\n")
@@ -4,81 +4,229 @@
 
 import sys
 import re
+import csv
+import string
 from typing import Dict, List, Optional, Any
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QSplitter, QTreeWidget, QTreeWidgetItem, QTableWidget, QTableWidgetItem,
     QTextEdit, QLabel, QPushButton, QDialog, QFormLayout, QLineEdit,
     QComboBox, QMessageBox, QCompleter, QFileDialog, QFrame, QGridLayout,
-    QListWidget, QListWidgetItem, QTabWidget, QSpinBox, QDoubleSpinBox
+    QListWidget, QListWidgetItem, QTabWidget, QSpinBox, QDoubleSpinBox,
+    QHeaderView
 )
 from PyQt6.QtCore import Qt, QTimer, QStringListModel, pyqtSignal, QSize
-from PyQt6.QtGui import QFont, QSyntaxHighlighter, QTextCharFormat, QColor, QPixmap, QIcon
+from PyQt6.QtGui import (
+    QFont, QSyntaxHighlighter, QTextCharFormat, QColor, QPixmap, QIcon,
+    QShortcut, QKeySequence, QTextCursor
+)
 
 from visual_solving_advanced import (
-    HybridBoxSolution, solution_manager, HybridSolution
+    HybridBoxSolution, solution_manager, HybridSolution,
+    add_change_listener, remove_change_listener
 )
 from variable_system import ExpressionParser
 
+# Общий парсер выражений модуля
+_PARSER = ExpressionParser()
+
+# Подсветка формул одним проходом: имя группы = ключ в FormulaHighlighter.formats.
+# В каждой позиции побеждает первая подходящая альтернатива, поэтому
+# assignment/legacy стоят раньше reference, а number - раньше reference ("2.5" - число)
+_RE_HIGHLIGHT = re.compile(
+    r'(?P<assignment>\w+@\w+)'
+    r'|(?P<legacy>#\d+\.\w+)'
+    r'|(?P<number>\b\d+\.?\d*\b)'
+    r'|(?P<reference>\w+\.\w+)'
+    r'|(?P<function>\b(?:sqrt|sin|cos|tan|max|min|abs|pow|exp|log)\b)'
+)
+
+# Значение для отсутствующих данных в реестре
+_NA = "N/A"
+
+def _format_value(value: Optional[float]) -> str:
+    """Форматирование значения переменной для реестра"""
+    return _NA if value is None else f"{value:.2f}"
+
+# Символы идентификаторов (плюс любые буквы): только после них имеет смысл автодополнение
+_IDENT_CHARS = frozenset(string.ascii_letters + string.digits + '_.@')
+
+# Идентификатор, заканчивающийся в позиции курсора
+_RE_TAIL_WORD = re.compile(r'[\w.@]+$')
+
+# Буфер записи при экспорте реестра
+_EXPORT_BUFFER_SIZE = 1 << 20
+
+# Только цифры и арифметика - кандидат на вычисление в предпросмотре
+_RE_ARITH_ONLY = re.compile(r'[\d.+\-*/() ]+')
+
 class FormulaHighlighter(QSyntaxHighlighter):
     """
     Подсветка синтаксиса для формул с новым синтаксисом
     """
     
+    # Форматы создаются один раз и общие для всех подсветчиков
+    _FORMATS: Optional[Dict[str, QTextCharFormat]] = None
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         
         # Форматы для подсветки
-        self.formats = {}
+        if FormulaHighlighter._FORMATS is None:
+            FormulaHighlighter._FORMATS = self._build_formats()
+        self.formats = FormulaHighlighter._FORMATS
+    
+    @staticmethod
+    def _build_formats() -> Dict[str, QTextCharFormat]:
+        formats = {}
         
         # @ символы (оранжевый)
-        self.formats['assignment'] = QTextCharFormat()
-        self.formats['assignment'].setForeground(QColor("#e67e22"))  # Оранжевый
-        self.formats['assignment'].setFontWeight(QFont.Weight.Bold)
+        formats['assignment'] = QTextCharFormat()
+        formats['assignment'].setForeground(QColor("#e67e22"))  # Оранжевый
+        formats['assignment'].setFontWeight(QFont.Weight.Bold)
         
         # . символы (синий)
-        self.formats['reference'] = QTextCharFormat()
-        self.formats['reference'].setForeground(QColor("#3498db"))  # Синий
-        self.formats['reference'].setFontWeight(QFont.Weight.Bold)
+        formats['reference'] = QTextCharFormat()
+        formats['reference'].setForeground(QColor("#3498db"))  # Синий
+        formats['reference'].setFontWeight(QFont.Weight.Bold)
         
         # Числа (зеленый)
-        self.formats['number'] = QTextCharFormat()
-        self.formats['number'].setForeground(QColor("#27ae60"))  # Зеленый
+        formats['number'] = QTextCharFormat()
+        formats['number'].setForeground(QColor("#27ae60"))  # Зеленый
         
         # Функции (фиолетовый)
-        self.formats['function'] = QTextCharFormat()
-        self.formats['function'].setForeground(QColor("#9b59b6"))  # Фиолетовый
-        self.formats['function'].setFontWeight(QFont.Weight.Bold)
+        formats['function'] = QTextCharFormat()
+        formats['function'].setForeground(QColor("#9b59b6"))  # Фиолетовый
+        formats['function'].setFontWeight(QFont.Weight.Bold)
         
         # Legacy синтаксис (серый)
-        self.formats['legacy'] = QTextCharFormat()
-        self.formats['legacy'].setForeground(QColor("#95a5a6"))  # Серый
+        formats['legacy'] = QTextCharFormat()
+        formats['legacy'].setForeground(QColor("#95a5a6"))  # Серый
         
+        return formats
+    
     def highlightBlock(self, text: str):
         """Подсветка блока текста"""
+        # Пустые строки - частый случай при наборе, подсвечивать нечего
+        if not text or text.isspace():
+            return
         
-        # @ символы для assignment
-        for match in re.finditer(r'\w+@\w+', text):
-            self.setFormat(match.start(), match.end() - match.start(), self.formats['assignment'])
-        
-        # . символы для reference  
-        for match in re.finditer(r'\w+\.\w+', text):
-            self.setFormat(match.start(), match.end() - match.start(), self.formats['reference'])
-        
-        # Legacy синтаксис #1.variable
-        for match in re.finditer(r'#\d+\.\w+', text):
-            self.setFormat(match.start(), match.end() - match.start(), self.formats['legacy'])
+        # Один проход: variable@solution, #1.variable, числа, variable.solution, функции.
+        # Соседние совпадения одного вида склеиваются в один вызов setFormat
+        formats = self.formats
+        run_start = run_end = 0
+        run_group = None
+        for match in _RE_HIGHLIGHT.finditer(text):
+            start, end = match.span()
+            group = match.lastgroup
+            if group == run_group and start == run_end:
+                run_end = end
+                continue
+            if run_group is not None:
+                self.setFormat(run_start, run_end - run_start, formats[run_group])
+            run_start, run_end, run_group = start, end, group
+        if run_group is not None:
+            self.setFormat(run_start, run_end - run_start, formats[run_group])
+
+# Математические функции для автодополнения
+_MATH_COMPLETIONS = (
+    'sqrt(', 'sin(', 'cos(', 'tan(', 'max(', 'min(', 'abs(',
+    'pow(', 'exp(', 'log(', 'log10(', 'ceil(', 'floor(', 'round('
+)
+
+class _CompletionIndex:
+    """
+    Общий список автодополнений, обновляемый по изменениям решений
+    
+    Вклад каждого решения хранится отдельно: при изменении пересчитывается
+    только это решение, а модель QStringListModel одна на все completer'ы.
+    Один и тот же идентификатор (например, алиас L) может давать несколько
+    решений - поэтому ведётся счётчик вхождений.
+    """
+    
+    def __init__(self):
+        self.model = QStringListModel()
+        self._by_solution: Dict[str, set] = {}  # {solution_name: идентификаторы}
+        self._counts: Dict[str, int] = dict.fromkeys(_MATH_COMPLETIONS, 1)
+        self.rebuild()
+        add_change_listener(self._on_solutions_changed)
+    
+    @staticmethod
+    def _solution_completions(solution: HybridSolution) -> set:
+        # Только имена: get_all_variables_info вычислял бы все формулы решения
+        # на каждое изменение модели
+        completions = set()
+        solution_name = solution.name
+        for var_name, variable in solution.variables.items():
+            # Новый синтаксис
+            completions.add(f"{var_name}.{solution_name}")  # variable.solution
+            completions.add(f"{var_name}@{solution_name}")  # variable@solution
+            
+            # Legacy синтаксис
+            legacy_id = getattr(variable, 'legacy_id', None)
+            if legacy_id:
+                completions.add(f"#{legacy_id}.{var_name}")
         
-        # Числа
-        for match in re.finditer(r'\b\d+\.?\d*\b', text):
-            self.setFormat(match.start(), match.end() - match.start(), self.formats['number'])
+        # Алиасы
+        for aliases in solution._alias_index.values():
+            completions.update(aliases)
+        return completions
+    
+    def _replace(self, solution_name: str, completions: set) -> bool:
+        """Заменить вклад решения; True, если список автодополнений изменился"""
+        old = self._by_solution.pop(solution_name, set())
+        if completions:
+            self._by_solution[solution_name] = completions
+        
+        counts = self._counts
+        changed = False
+        for item in old - completions:
+            counts[item] -= 1
+            if not counts[item]:
+                del counts[item]
+                changed = True
+        for item in completions - old:
+            if item not in counts:
+                counts[item] = 0
+                changed = True
+            counts[item] += 1
+        return changed
+    
+    def _publish(self):
+        # Порядок без учёта регистра - completer ищет префикс двоичным поиском
+        self.model.setStringList(sorted(self._counts, key=str.casefold))
+    
+    def rebuild(self):
+        """Пересчитать вклад всех решений"""
+        solutions = {solution.name: solution for solution in solution_manager.get_all_solutions()}
+        for name in list(self._by_solution):
+            if name not in solutions:
+                self._replace(name, set())
+        for name, solution in solutions.items():
+            self._replace(name, self._solution_completions(solution))
+        self._publish()
+    
+    def _on_solutions_changed(self, solution: Optional[HybridSolution]):
+        if solution is None:
+            self.rebuild()
+            return
         
-        # Математические функции
-        functions = ['sqrt', 'sin', 'cos', 'tan', 'max', 'min', 'abs', 'pow', 'exp', 'log']
-        for func in functions:
-            pattern = f'\\b{func}\\b'
-            for match in re.finditer(pattern, text):
-                self.setFormat(match.start(), match.end() - match.start(), self.formats['function'])
+        # Решения вне менеджера в автодополнение не входят
+        if solution_manager.get_solution(solution.name) is solution:
+            completions = self._solution_completions(solution)
+        else:
+            completions = set()
+        if self._replace(solution.name, completions):
+            self._publish()
+
+_completion_index: Optional[_CompletionIndex] = None
+
+def _get_completion_index() -> _CompletionIndex:
+    """Общий индекс автодополнений (создаётся при первом completer'е, когда есть QApplication)"""
+    global _completion_index
+    if _completion_index is None:
+        _completion_index = _CompletionIndex()
+    return _completion_index
 
 class VariableCompleter(QCompleter):
     """
@@ -88,38 +236,18 @@ class VariableCompleter(QCompleter):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
-        self.setFilterMode(Qt.MatchFlag.MatchContains)
-        self.update_completions()
+        self.setModel(_get_completion_index().model)
+        # Модель отсортирована без учёта регистра: поиск по префиксу - двоичный
+        self.setModelSorting(QCompleter.ModelSorting.CaseInsensitivelySortedModel)
+        self.set_substring_matching(False)
+    
+    def set_substring_matching(self, enabled: bool):
+        """Поиск по подстроке (полный перебор) вместо поиска по префиксу"""
+        self.setFilterMode(Qt.MatchFlag.MatchContains if enabled else Qt.MatchFlag.MatchStartsWith)
     
     def update_completions(self):
-        """Обновление списка автодополнений"""
-        completions = []
-        
-        # Добавляем переменные из всех решений
-        for solution in solution_manager.get_all_solutions():
-            for var_info in solution.get_all_variables_info():
-                # Новый синтаксис
-                completions.append(var_info['read_id'])  # variable.solution
-                completions.append(var_info['write_id'])  # variable@solution
-                
-                # Legacy синтаксис
-                if var_info.get('legacy_id'):
-                    completions.append(var_info['legacy_id'])
-                
-                # Алиасы
-                for alias in var_info['aliases']:
-                    completions.append(alias)
-        
-        # Математические функции
-        math_functions = [
-            'sqrt(', 'sin(', 'cos(', 'tan(', 'max(', 'min(', 'abs(',
-            'pow(', 'exp(', 'log(', 'log10(', 'ceil(', 'floor(', 'round('
-        ]
-        completions.extend(math_functions)
-        
-        # Обновляем модель
-        model = QStringListModel(completions)
-        self.setModel(model)
+        """Обновление списка автодополнений (обычно не нужно - индекс следит за изменениями сам)"""
+        _get_completion_index().rebuild()
 
 class GlobalVariableRegistryWindow(QDialog):
     """
@@ -148,6 +276,10 @@ class GlobalVariableRegistryWindow(QDialog):
             "Solution", "Variable", "Value", "Write ID", "Read ID", 
             "Legacy ID", "Type", "Formula/Dependencies"
         ])
+        # Ширина колонок не пересчитывается при каждом обновлении - только по кнопке
+        table_header = self.variables_table.horizontalHeader()
+        table_header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        table_header.setStretchLastSection(True)
         layout.addWidget(self.variables_table)
         
         # Кнопки
@@ -161,6 +293,10 @@ class GlobalVariableRegistryWindow(QDialog):
         export_btn.clicked.connect(self.export_data)
         button_layout.addWidget(export_btn)
         
+        fit_btn = QPushButton("↔️ Fit columns")
+        fit_btn.clicked.connect(self.variables_table.resizeColumnsToContents)
+        button_layout.addWidget(fit_btn)
+        
         button_layout.addStretch()
         
         close_btn = QPushButton("✖️ Close")
@@ -174,44 +310,43 @@ class GlobalVariableRegistryWindow(QDialog):
         """Обновление данных в таблице"""
         global_info = solution_manager.get_global_registry_info()
         
-        self.variables_table.setRowCount(len(global_info))
+        table = self.variables_table
         
-        for row, var_info in enumerate(global_info):
-            # Solution
-            self.variables_table.setItem(row, 0, QTableWidgetItem(var_info['solution_name']))
-            
-            # Variable
-            self.variables_table.setItem(row, 1, QTableWidgetItem(var_info['name']))
-            
-            # Value
-            value_str = f"{var_info['value']:.2f}" if var_info['value'] is not None else "N/A"
-            self.variables_table.setItem(row, 2, QTableWidgetItem(value_str))
-            
-            # Write ID
-            self.variables_table.setItem(row, 3, QTableWidgetItem(var_info['write_id']))
-            
-            # Read ID
-            self.variables_table.setItem(row, 4, QTableWidgetItem(var_info['read_id']))
-            
-            # Legacy ID
-            legacy_id = var_info.get('legacy_id', 'N/A')
-            self.variables_table.setItem(row, 5, QTableWidgetItem(str(legacy_id)))
-            
-            # Type
-            self.variables_table.setItem(row, 6, QTableWidgetItem(var_info['type']))
-            
-            # Formula/Dependencies
-            if var_info['is_formula']:
-                formula_info = f"Formula: {var_info['raw_value']}"
-                if var_info['dependencies']:
-                    formula_info += f" | Deps: {', '.join(var_info['dependencies'])}"
-            else:
-                formula_info = "Direct value"
+        # Заполнение без перерисовок и сортировки на каждом setItem
+        sorting_enabled = table.isSortingEnabled()
+        table.setSortingEnabled(False)
+        table.setUpdatesEnabled(False)
+        table.blockSignals(True)
+        try:
+            table.setRowCount(len(global_info))
             
-            self.variables_table.setItem(row, 7, QTableWidgetItem(formula_info))
-        
-        # Автоподстройка колонок
-        self.variables_table.resizeColumnsToContents()
+            set_item = table.setItem
+            item = QTableWidgetItem
+            for row, var_info in enumerate(global_info):
+                get = var_info.get
+                set_item(row, 0, item(var_info['solution_name']))  # Solution
+                set_item(row, 1, item(var_info['name']))  # Variable
+                set_item(row, 2, item(_format_value(var_info['value'])))  # Value
+                set_item(row, 3, item(var_info['write_id']))  # Write ID
+                set_item(row, 4, item(var_info['read_id']))  # Read ID
+                set_item(row, 5, item(str(get('legacy_id', _NA))))  # Legacy ID
+                set_item(row, 6, item(var_info['type']))  # Type
+                
+                # Formula/Dependencies
+                if var_info['is_formula']:
+                    formula_info = f"Formula: {var_info['raw_value']}"
+                    dependencies = var_info['dependencies']
+                    if dependencies:
+                        formula_info += f" | Deps: {', '.join(dependencies)}"
+                else:
+                    formula_info = "Direct value"
+                
+                set_item(row, 7, item(formula_info))
+        finally:
+            table.blockSignals(False)
+            table.setUpdatesEnabled(True)
+            table.setSortingEnabled(sorting_enabled)
+        table.viewport().update()
     
     def export_data(self):
         """Экспорт данных в файл"""
@@ -224,19 +359,20 @@ class GlobalVariableRegistryWindow(QDialog):
             try:
                 global_info = solution_manager.get_global_registry_info()
                 
-                with open(filename, 'w', encoding='utf-8') as f:
+                with open(filename, 'w', encoding='utf-8', newline='', buffering=_EXPORT_BUFFER_SIZE) as f:
+                    writer = csv.writer(f)
+                    
                     # Заголовок
-                    f.write("Solution,Variable,Value,Write_ID,Read_ID,Legacy_ID,Type,Formula\n")
+                    writer.writerow(["Solution", "Variable", "Value", "Write_ID", "Read_ID",
+                                     "Legacy_ID", "Type", "Formula"])
                     
                     # Данные
-                    for var_info in global_info:
-                        value_str = f"{var_info['value']:.2f}" if var_info['value'] is not None else "N/A"
-                        legacy_id = var_info.get('legacy_id', 'N/A')
-                        formula = var_info['raw_value'] if var_info['is_formula'] else "direct"
-                        
-                        f.write(f"{var_info['solution_name']},{var_info['name']},{value_str},"
-                               f"{var_info['write_id']},{var_info['read_id']},{legacy_id},"
-                               f"{var_info['type']},{formula}\n")
+                    writer.writerows(
+                        (var_info['solution_name'], var_info['name'], _format_value(var_info['value']),
+                         var_info['write_id'], var_info['read_id'], var_info.get('legacy_id', _NA),
+                         var_info['type'], var_info['raw_value'] if var_info['is_formula'] else "direct")
+                        for var_info in global_info
+                    )
                 
                 QMessageBox.information(self, "Success", f"Data exported to {filename}")
                 
@@ -287,7 +423,12 @@ class VariableEditDialog(QDialog):
         
         # Автодополнение
         self.completer = VariableCompleter()
-        self.value_edit.textChanged.connect(self._on_text_changed)
+        self.completer.setWidget(self.value_edit)
+        self.completer.activated.connect(self._insert_completion)
+        
+        # Ctrl+Space - поиск по подстроке для текущего слова
+        substring_shortcut = QShortcut(QKeySequence("Ctrl+Space"), self.value_edit)
+        substring_shortcut.activated.connect(self._complete_substring)
         
         form_layout.addRow("Value/Formula:", self.value_edit)
         
@@ -334,18 +475,69 @@ class VariableEditDialog(QDialog):
         layout.addLayout(button_layout)
         self.setLayout(layout)
         
-        # Обновление предварительного просмотра
-        self.value_edit.textChanged.connect(self.update_preview)
-        self.name_edit.textChanged.connect(self.update_preview)
+        # Обновление предварительного просмотра и автодополнения с задержкой:
+        # серия нажатий клавиш даёт одно обновление
+        self._preview_timer = QTimer(self)
+        self._preview_timer.setSingleShot(True)
+        self._preview_timer.setInterval(120)
+        self._preview_timer.timeout.connect(self._on_typing_paused)
+        self.value_edit.textChanged.connect(self._preview_timer.start)
+        self.name_edit.textChanged.connect(self._preview_timer.start)
+    
+    def _on_typing_paused(self):
+        """Отложенная обработка ввода"""
+        self._on_text_changed()
+        self.update_preview()
+    
+    def _complete_substring(self):
+        """Показать автодополнение по подстроке (по умолчанию - только по префиксу)"""
+        word = self._word_before_cursor()
+        if not word:
+            return
+        
+        self.completer.set_substring_matching(True)
+        self.completer.setCompletionPrefix(word)
+        if self.completer.completionCount() == 0:
+            self.completer.set_substring_matching(False)
+            return
+        
+        # Режим подстроки действует, пока открыт список: выбор варианта
+        # или следующий ввод возвращают поиск по префиксу
+        popup = self.completer.popup()
+        rect = self.value_edit.cursorRect()
+        rect.setWidth(popup.sizeHintForColumn(0) + popup.verticalScrollBar().sizeHint().width())
+        self.completer.complete(rect)
+    
+    def _insert_completion(self, completion: str):
+        """Заменить слово перед курсором выбранным вариантом"""
+        cursor = self.value_edit.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.Left, QTextCursor.MoveMode.KeepAnchor,
+                            len(self.completer.completionPrefix()))
+        cursor.insertText(completion)
+        self.value_edit.setTextCursor(cursor)
+        self.completer.set_substring_matching(False)
+    
+    def _word_before_cursor(self) -> str:
+        """Слово перед курсором (вместе с @ и . - это и есть префикс ссылки)"""
+        cursor = self.value_edit.textCursor()
+        block_text = cursor.block().text()
+        column = cursor.positionInBlock()
+        
+        # Перед курсором оператор, пробел или начало строки - дополнять нечего
+        char = block_text[column - 1:column]
+        if char not in _IDENT_CHARS and not char.isalnum():
+            return ''
+        
+        match = _RE_TAIL_WORD.search(block_text, 0, column)
+        return match.group(0) if match else ''
     
     def _on_text_changed(self):
         """Обработка изменения текста для автодополнения"""
         # Простая реализация автодополнения
-        cursor = self.value_edit.textCursor()
-        cursor.select(cursor.SelectionType.WordUnderCursor)
-        word = cursor.selectedText()
+        word = self._word_before_cursor()
         
         if len(word) > 1:
+            self.completer.set_substring_matching(False)
             self.completer.setCompletionPrefix(word)
             if self.completer.completionCount() > 0:
                 # Показываем автодополнение
@@ -365,8 +557,7 @@ class VariableEditDialog(QDialog):
                 self.type_combo.setCurrentIndex(type_index)
             
             # Алиасы
-            aliases = [alias for alias, var_name in self.solution.aliases.items() 
-                      if var_name == self.var_name]
+            aliases = self.solution._alias_index.get(self.var_name, ())
             self.alias_edit.setText(", ".join(aliases))
     
     def update_preview(self):
@@ -379,12 +570,15 @@ class VariableEditDialog(QDialog):
             preview += f"Read: {name}.{self.solution.name}\n"
             
             # Пытаемся вычислить значение
-            try:
-                if value.replace('.', '').replace('-', '').replace('+', '').replace('*', '').replace('/', '').replace('(', '').replace(')', '').replace(' ', '').isdigit():
-                    preview += f"Evaluated: {float(value):.2f}"
-                else:
-                    preview += f"Formula: {value}"
-            except:
+            evaluated = None
+            if _RE_ARITH_ONLY.fullmatch(value):
+                try:
+                    evaluated = float(value)
+                except ValueError:
+                    pass
+            if evaluated is not None:
+                preview += f"Evaluated: {evaluated:.2f}"
+            else:
                 preview += f"Formula: {value}"
             
             self.preview_text.setText(preview)
@@ -401,7 +595,7 @@ class VariableEditDialog(QDialog):
             return
         
         # Валидация имени
-        parser = ExpressionParser()
+        parser = _PARSER
         if not parser.validate_name(name):
             QMessageBox.warning(self, "Warning", 
                               "Invalid name. Must start with letter/digit and contain only letters, digits, and underscore. Cannot contain @ or .")
@@ -515,7 +709,7 @@ class CreateBoxDialog(QDialog):
             return
         
         # Валидация имени
-        parser = ExpressionParser()
+        parser = _PARSER
         if not parser.validate_name(name):
             QMessageBox.warning(self, "Warning", 
                               "Invalid solution name. Must start with letter/digit and contain only letters, digits, and underscore.")
@@ -545,10 +739,12 @@ class AdvancedMainWindow(QMainWindow):
         self.setWindowTitle("🚀 Visual Solving - Revolutionary CAD System")
         self.setGeometry(100, 100, 1400, 800)
         
-        # Таймер для автообновления
-        self.update_timer = QTimer()
-        self.update_timer.timeout.connect(self.refresh_ui)
-        self.update_timer.start(1000)  # Обновление каждую секунду
+        # Обновление по изменениям решений вместо опроса таймером
+        self._refresh_pending = False
+        add_change_listener(self._schedule_refresh)
+        
+        # Окно глобального реестра создаётся при первом открытии и переиспользуется
+        self._global_registry_dlg: Optional[GlobalVariableRegistryWindow] = None
         
         self.setup_ui()
         self.setup_menu()
@@ -556,6 +752,31 @@ class AdvancedMainWindow(QMainWindow):
         # Создание демо данных
         self.create_demo_data()
     
+    def _schedule_refresh(self, solution=None):
+        """Запланировать refresh_ui; пачка изменений за один проход цикла событий - одно обновление"""
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            QTimer.singleShot(0, self._run_scheduled_refresh)
+    
+    def _run_scheduled_refresh(self):
+        self._refresh_pending = False
+        self.refresh_ui()
+    
+    def closeEvent(self, event):
+        remove_change_listener(self._schedule_refresh)
+        super().closeEvent(event)
+    
+    def open_global_registry(self):
+        """Открытие окна глобального реестра переменных"""
+        if self._global_registry_dlg is None:
+            # Конструктор сам заполняет таблицу
+            self._global_registry_dlg = GlobalVariableRegistryWindow(self)
+        else:
+            self._global_registry_dlg.refresh_data()
+        self._global_registry_dlg.show()
+        self._global_registry_dlg.raise_()
+        self._global_registry_dlg.activateWindow()
+    
     def setup_ui(self):
         """Настройка интерфейса"""
         central_widget = QWidget()
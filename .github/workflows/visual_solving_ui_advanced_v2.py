@@ -17,6 +17,15 @@ import json
 import traceback
 import re
 
+# Подсветка формул через RE2 (линейное время на любом вводе): pip install google-re2.
+# Без него - стандартный re
+try:
+    import re2 as _highlight_re
+    RE2_AVAILABLE = True
+except ImportError:
+    _highlight_re = re
+    RE2_AVAILABLE = False
+
 # Импорт новой системы V2
 try:
     from variable_system_v2 import (
@@ -26,7 +35,7 @@ try:
     from visual_solving_advanced_v2 import (
         HybridSolution, HybridBoxSolution as BoxSolution, HybridEdgeBandingSolution as EdgeBandingSolution, 
         Part3DSpace, HybridVariable, VariableType, v2_solution_manager,
-        V2GlobalVariableRegistry, v2_dependency_tracker
+        V2GlobalVariableRegistry, VarInfo, v2_dependency_tracker
     )
     CORE_V2_AVAILABLE = True
 except ImportError as e:
@@ -37,6 +46,27 @@ except ImportError as e:
 # Подсветка синтаксиса для новой системы V2
 # =============================================================================
 
+# Подсветка одним проходом: имя последней группы альтернативы определяет вид.
+# Ссылки стоят раньше функций; имя функции внутри ссылки перекрашивается
+# отдельно - результат совпадает с прежними раздельными проходами, кроме
+# недопустимой смешанной формы x@box.length: хвост .length уже не
+# подсвечивается как чтение (совпадения не пересекаются)
+_HIGHLIGHT_RE = _highlight_re.compile(
+    r'(?P<write>[a-zA-Z_][a-zA-Z0-9_]*)(?P<at>@)(?P<write_solution>[a-zA-Z_][a-zA-Z0-9_]*)'
+    r'|(?P<read>[a-zA-Z_][a-zA-Z0-9_]*)(?P<dot>\.)(?P<read_solution>[a-zA-Z_][a-zA-Z0-9_]*)'
+    r'|(?P<number>\b\d+(?:\.\d+)?\b)'
+    r'|(?P<operator>[+\-*/^()=])'
+    r'|(?P<function>\b(?:sin|cos|tan|sqrt|abs|min|max|round)\b)'
+)
+
+_FUNCTION_NAMES = frozenset(('sin', 'cos', 'tan', 'sqrt', 'abs', 'min', 'max', 'round'))
+
+# Ссылки: последняя группа -> (группа, ключ формата) для переменной, символа и solution
+_REFERENCE_GROUPS = {
+    'write_solution': (('write', 'variable_write'), ('at', 'at_symbol'), ('write_solution', 'variable_write')),
+    'read_solution': (('read', 'variable_read'), ('dot', 'dot_symbol'), ('read_solution', 'variable_read')),
+}
+
 class V2FormulaHighlighter(QSyntaxHighlighter):
     """Подсветка синтаксиса для формул V2 (variable@solution и variable.solution)"""
     
@@ -81,45 +111,29 @@ class V2FormulaHighlighter(QSyntaxHighlighter):
         self.formats['dot_symbol'].setFontWeight(QFont.Weight.Bold)
     
     def highlightBlock(self, text):
-        # Запись переменных: variable@solution
-        write_pattern = r'([a-zA-Z_][a-zA-Z0-9_]*)(@)([a-zA-Z_][a-zA-Z0-9_]*)'
-        for match in re.finditer(write_pattern, text):
-            # Переменная
-            self.setFormat(match.start(1), match.end(1) - match.start(1), self.formats['variable_write'])
-            # @ символ
-            self.setFormat(match.start(2), match.end(2) - match.start(2), self.formats['at_symbol'])
-            # Solution
-            self.setFormat(match.start(3), match.end(3) - match.start(3), self.formats['variable_write'])
-        
-        # Чтение переменных: variable.solution
-        read_pattern = r'([a-zA-Z_][a-zA-Z0-9_]*)(\.)([a-zA-Z_][a-zA-Z0-9_]*)'
-        for match in re.finditer(read_pattern, text):
-            # Переменная
-            self.setFormat(match.start(1), match.end(1) - match.start(1), self.formats['variable_read'])
-            # . символ
-            self.setFormat(match.start(2), match.end(2) - match.start(2), self.formats['dot_symbol'])
-            # Solution
-            self.setFormat(match.start(3), match.end(3) - match.start(3), self.formats['variable_read'])
-        
-        # Числа
-        number_pattern = r'\b\d+(\.\d+)?\b'
-        for match in re.finditer(number_pattern, text):
-            self.setFormat(match.start(), match.end() - match.start(), self.formats['number'])
-        
-        # Операторы
-        operator_pattern = r'[+\-*/^()=]'
-        for match in re.finditer(operator_pattern, text):
-            self.setFormat(match.start(), match.end() - match.start(), self.formats['operator'])
-        
-        # Функции
-        function_pattern = r'\b(sin|cos|tan|sqrt|abs|min|max|round)\b'
-        for match in re.finditer(function_pattern, text):
-            self.setFormat(match.start(), match.end() - match.start(), self.formats['function'])
+        # variable@solution, variable.solution, числа, операторы и функции за один проход
+        formats = self.formats
+        for match in _HIGHLIGHT_RE.finditer(text):
+            kind = match.lastgroup
+            parts = _REFERENCE_GROUPS.get(kind)
+            if parts is None:
+                start, end = match.span()
+                self.setFormat(start, end - start, formats[kind])
+                continue
+            
+            for group, format_key in parts:
+                start, end = match.span(group)
+                if match.group(group) in _FUNCTION_NAMES:
+                    format_key = 'function'
+                self.setFormat(start, end - start, formats[format_key])
 
 # =============================================================================
 # Автодополнение для новой системы V2
 # =============================================================================
 
+# Математические функции для автодополнения
+_MATH_FUNCTIONS = ('sin', 'cos', 'tan', 'sqrt', 'abs', 'min', 'max', 'round')
+
 class V2VariableCompleter(QCompleter):
     """Автодополнение для переменных V2"""
     
@@ -134,22 +148,20 @@ class V2VariableCompleter(QCompleter):
         if not CORE_V2_AVAILABLE:
             return
         
-        completions = []
-        
         # Получаем все solutions
         all_solutions = v2_solution_manager.get_all_solutions()
         
-        for solution_name, solution in all_solutions.items():
-            for var_name in solution.variables.keys():
-                # Добавляем варианты для записи
-                completions.append(f"{var_name}@{solution_name}")
-                
-                # Добавляем варианты для чтения
-                completions.append(f"{var_name}.{solution_name}")
+        def iter_ids():
+            for solution_name, solution in all_solutions.items():
+                for var in solution.get_all_variables():
+                    var_name = var.name
+                    # Вариант для записи
+                    yield f"{var_name}@{solution_name}"
+                    # Вариант для чтения
+                    yield f"{var_name}.{solution_name}"
         
-        # Добавляем функции
-        functions = ['sin', 'cos', 'tan', 'sqrt', 'abs', 'min', 'max', 'round']
-        completions.extend(functions)
+        # Без повторов, вместе с функциями
+        completions = sorted(set(iter_ids()).union(_MATH_FUNCTIONS), key=str.casefold)
         
         # Устанавливаем модель
         model = QStringListModel(completions)
@@ -408,45 +420,45 @@ class V2GlobalVariableRegistryWindow(QMainWindow):
         
         for row, var_info in enumerate(variables_info):
             # Solution
-            solution_name = var_info.get('solution_name', 'Unknown')
+            solution_name = var_info.solution_name
             self.variables_table.setItem(row, 0, QTableWidgetItem(solution_name))
             
             # Write ID (V2)
-            write_id = var_info.get('new_write_id', '')
+            write_id = var_info.new_write_id
             write_id_item = QTableWidgetItem(write_id)
             write_id_item.setForeground(QColor("#cc6600"))
             self.variables_table.setItem(row, 1, write_id_item)
             
             # Read ID (V2)
-            read_id = var_info.get('new_read_id', '')
+            read_id = var_info.new_read_id
             read_id_item = QTableWidgetItem(read_id)
             read_id_item.setForeground(QColor("#0066cc"))
             self.variables_table.setItem(row, 2, read_id_item)
             
             # Legacy ID
-            legacy_id = var_info.get('legacy_full_id', '')
+            legacy_id = var_info.legacy_full_id
             legacy_id_item = QTableWidgetItem(legacy_id)
             legacy_id_item.setForeground(QColor("#999999"))
             self.variables_table.setItem(row, 3, legacy_id_item)
             
             # Name
-            self.variables_table.setItem(row, 4, QTableWidgetItem(var_info.get('name', '')))
+            self.variables_table.setItem(row, 4, QTableWidgetItem(var_info.name))
             
             # Value/Formula
-            if var_info.get('is_formula', False):
-                formula = var_info.get('formula', '')
-                computed = var_info.get('computed_value', 0)
+            if var_info.is_formula:
+                formula = var_info.formula
+                computed = var_info.computed_value
                 value_text = f"= {formula} → {computed}"
                 value_item = QTableWidgetItem(value_text)
                 value_item.setForeground(QColor("#cc6600"))
             else:
-                value_text = str(var_info.get('value', ''))
+                value_text = str(var_info.value)
                 value_item = QTableWidgetItem(value_text)
             
             self.variables_table.setItem(row, 5, value_item)
             
             # Type
-            var_type = var_info.get('type', 'unknown')
+            var_type = var_info.type
             type_item = QTableWidgetItem(var_type)
             if var_type == 'formula':
                 type_item.setForeground(QColor("#cc6600"))
@@ -455,17 +467,17 @@ class V2GlobalVariableRegistryWindow(QMainWindow):
             self.variables_table.setItem(row, 6, type_item)
             
             # Aliases
-            aliases = var_info.get('aliases', [])
+            aliases = var_info.aliases
             aliases_text = ", ".join(aliases) if aliases else ""
             self.variables_table.setItem(row, 7, QTableWidgetItem(aliases_text))
             
             # Dependencies
-            dependencies = var_info.get('dependencies', [])
+            dependencies = var_info.dependencies
             deps_text = ", ".join(dependencies) if dependencies else ""
             self.variables_table.setItem(row, 8, QTableWidgetItem(deps_text))
             
             # Dependents
-            dependents = var_info.get('dependents', [])
+            dependents = var_info.dependents
             dependents_text = ", ".join(dependents) if dependents else ""
             self.variables_table.setItem(row, 9, QTableWidgetItem(dependents_text))
     
@@ -479,9 +491,9 @@ class V2GlobalVariableRegistryWindow(QMainWindow):
         formula_vars = []
         
         for solution_name, solution in all_solutions.items():
-            for var_name, var in solution.variables.items():
+            for var in solution.get_all_variables():
                 if var.is_formula:
-                    formula_vars.append((solution_name, var_name, var))
+                    formula_vars.append((solution_name, var.name, var))
         
         if not formula_vars:
             text += "No formula variables found.\n"
@@ -517,10 +529,11 @@ class V2GlobalVariableRegistryWindow(QMainWindow):
         alias_count = 0
         
         for solution in all_solutions.values():
-            total_variables += len(solution.variables)
+            solution_variables = solution.get_all_variables()
+            total_variables += len(solution_variables)
             alias_count += len(solution.aliases)
             
-            for var in solution.variables.values():
+            for var in solution_variables:
                 if var.is_formula:
                     formula_count += 1
         
@@ -546,29 +559,30 @@ class V2GlobalVariableRegistryWindow(QMainWindow):
         if all_solutions:
             stats_text += f"\nVariables per Solution:\n"
             for solution_name, solution in all_solutions.items():
-                var_count = len(solution.variables)
-                formula_count_sol = sum(1 for var in solution.variables.values() if var.is_formula)
+                solution_variables = solution.get_all_variables()
+                var_count = len(solution_variables)
+                formula_count_sol = sum(1 for var in solution_variables if var.is_formula)
                 stats_text += f"  {solution_name}: {var_count} variables ({formula_count_sol} formulas)\n"
         
         self.stats_text.setText(stats_text)
     
-    def _matches_search_v2(self, var_info: dict, search_term: str) -> bool:
+    def _matches_search_v2(self, var_info: VarInfo, search_term: str) -> bool:
         """Проверить, соответствует ли переменная поисковому запросу V2"""
         searchable_fields = [
-            var_info.get('name', ''),
-            var_info.get('new_write_id', ''),
-            var_info.get('new_read_id', ''),
-            var_info.get('legacy_full_id', ''),
-            var_info.get('solution_name', ''),
+            var_info.name,
+            var_info.new_write_id,
+            var_info.new_read_id,
+            var_info.legacy_full_id,
+            var_info.solution_name,
         ]
         
         # Поиск в алиасах
-        aliases = var_info.get('aliases', [])
+        aliases = var_info.aliases
         searchable_fields.extend(aliases)
         
         # Поиск в формуле
-        if var_info.get('is_formula') and var_info.get('formula'):
-            searchable_fields.append(var_info['formula'])
+        if var_info.is_formula and var_info.formula:
+            searchable_fields.append(var_info.formula)
         
         return any(search_term in field.lower() for field in searchable_fields)
     
@@ -611,17 +625,16 @@ class V2GlobalVariableRegistryWindow(QMainWindow):
             parsed = ExpressionParser.parse_expression(expression)
             
             result_text = f"Expression: {expression}\n"
-            result_text += f"Type: {parsed['type'].value}\n"
+            result_text += f"Type: {parsed.type.value}\n"
             result_text += "-" * 40 + "\n"
             
-            for key, value in parsed.items():
-                if key != 'type':
-                    result_text += f"{key}: {value}\n"
+            for key, value in parsed.fields().items():
+                result_text += f"{key}: {value}\n"
             
             # Если это формула, пытаемся вычислить
-            if parsed['type'] == ExpressionType.FORMULA:
+            if parsed.type == ExpressionType.FORMULA:
                 try:
-                    formula = parsed['formula']
+                    formula = parsed.formula
                     solution_registry = v2_solution_manager.get_all_solutions()
                     result = V2FormulaEvaluator.evaluate_formula(formula, solution_registry)
                     result_text += f"\nComputed Result: {result}\n"
@@ -649,9 +662,11 @@ class V2GlobalVariableRegistryWindow(QMainWindow):
         
         if filename:
             try:
-                variables_info = V2GlobalVariableRegistry.get_all_variables_info()
+                variables_info = [info.as_dict() for info in V2GlobalVariableRegistry.get_all_variables_info()]
+                # json.dumps собирает текст целиком - одна запись вместо тысяч мелких
+                data = json.dumps(variables_info, indent=2, ensure_ascii=False)
                 with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(variables_info, f, indent=2, ensure_ascii=False)
+                    f.write(data)
                 
                 QMessageBox.information(self, "Success", f"Variables V2 exported to {filename}")
             except Exception as e:
@@ -666,7 +681,7 @@ class V2GlobalVariableRegistryWindow(QMainWindow):
         errors = []
         
         for solution in all_solutions.values():
-            for var in solution.variables.values():
+            for var in solution.get_all_variables():
                 if var.is_formula:
                     try:
                         var.get_computed_value(all_solutions)
@@ -868,16 +883,16 @@ class V2VariableEditDialog(QDialog):
         try:
             parsed = ExpressionParser.parse_expression(expression)
             
-            if parsed['type'] == ExpressionType.FORMULA:
+            if parsed.type == ExpressionType.FORMULA:
                 # Тестируем формулу
-                formula = parsed['formula']
+                formula = parsed.formula
                 solution_registry = v2_solution_manager.get_all_solutions()
                 result = V2FormulaEvaluator.evaluate_formula(formula, solution_registry)
                 
                 self.result_label.setText(f"✅ Result: {result}")
                 self.result_label.setStyleSheet("color: green;")
             else:
-                self.result_label.setText(f"✅ Valid {parsed['type'].value} expression")
+                self.result_label.setText(f"✅ Valid {parsed.type.value} expression")
                 self.result_label.setStyleSheet("color: green;")
                 
         except Exception as e: